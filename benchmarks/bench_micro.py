@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import es_reader  # noqa: E402
+import qml_render  # noqa: E402
+from es_items import create_default_views  # noqa: E402
+from property_types import parse_param, Color, NormPair  # noqa: E402
+from static import PropType  # noqa: E402
+
+
+PROP_SAMPLES = {
+    PropType.NORMALIZED_PAIR: '0.25 0.75',
+    PropType.NORMALIZED_RECT: '0.1 0.2 0.3 0.4',
+    PropType.PATH: './art/logo.svg',
+    PropType.STRING: 'Some text',
+    PropType.COLOR: 'FFFFFFD8',
+    PropType.FLOAT: '0.035',
+    PropType.BOOLEAN: 'true',
+}
+
+VIEW_XML = '''
+<view name="detailed">
+  <image name="background"><path>./${bg}</path><size>1 1</size></image>
+  <textlist name="gamelist">
+    <pos>0.5 0.2</pos><size>0.5 0.7</size><primaryColor>${main}</primaryColor>
+    <selectedColor>FFFFFF</selectedColor><fontSize>0.04</fontSize><alignment>left</alignment>
+  </textlist>
+  <text name="md_lbl_rating, md_lbl_releasedate, md_lbl_developer, md_lbl_publisher">
+    <color>${main}</color><fontSize>0.03</fontSize><forceUppercase>true</forceUppercase>
+  </text>
+  <text name="md_description"><pos>0.02 0.7</pos><size>0.45 0.25</size><color>${main}</color></text>
+  <image name="md_image"><pos>0.25 0.45</pos><maxSize>0.45 0.45</maxSize><origin>0.5 0.5</origin></image>
+</view>
+'''
+
+
+def make_cases():
+    cases = {}
+
+    variables = {f'var{idx}': f'value{idx}' for idx in range(20)}
+    long_text = ' '.join(f'${{var{idx % 20}}}' for idx in range(100))
+    cases['replace_variables (short)'] = lambda: es_reader.replace_variables('./art/${var1}.png', variables)
+    cases['replace_variables (100 vars)'] = lambda: es_reader.replace_variables(long_text, variables)
+
+    for prop_type, sample in PROP_SAMPLES.items():
+        cases[f'parse_param ({prop_type.name})'] = \
+            lambda prop_type=prop_type, sample=sample: parse_param('/theme', prop_type, sample)
+
+    cases['Color()'] = lambda: Color('FFFFFFD8')
+    cases['NormPair()'] = lambda: NormPair('0.25 0.75')
+
+    cases['get_defaults'] = lambda: qml_render.get_defaults('detailed', 'text', 'md_lbl_rating')
+
+    views = create_default_views('/theme')
+    elem = views['detailed']['md_image']
+    text_elem = views['detailed']['md_description']
+    cases['render_prop_pos'] = lambda: qml_render.render_prop_pos(elem, {})
+    cases['render_prop_fontinfo'] = lambda: qml_render.render_prop_fontinfo(text_elem, {})
+    cases['render_prop_textinfo'] = lambda: qml_render.render_prop_textinfo(text_elem, {})
+    cases['render_prop_opacity'] = lambda: qml_render.render_prop_opacity(text_elem, {})
+
+    def make_tree(depth, width):
+        qitem = qml_render.QmlItem('Item', {f'prop{idx}': f'{idx} * root.width' for idx in range(8)})
+        if depth:
+            qitem.childs = [make_tree(depth - 1, width) for _ in range(width)]
+        return qitem
+
+    deep_tree = make_tree(6, 3)
+    cases['QmlItem.render (1093 items)'] = lambda: deep_tree.render()
+    detailed_root = qml_render.create_view_items('detailed', views['detailed'].values())
+    cases['QmlItem.render (detailed view)'] = lambda: detailed_root.render()
+
+    viewnode = ET.fromstring(VIEW_XML)
+    view_vars = {'bg': 'art/bg.png', 'main': '48474D'}
+    cases['read_view'] = lambda: es_reader.read_view('/theme/main.xml', view_vars, 'detailed', viewnode, {})
+
+    return cases
+
+
+def measure_speed(func, min_time: float) -> float:
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return iterations / elapsed
+        iterations *= 2
+
+
+def measure_memory(func, calls: int = 20):
+    tracemalloc.start()
+    try:
+        func()  # warm up the caches
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start_size, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            func()
+        _, peak_size = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    # The blocks still held after the calls, eg. by caches; the blocks
+    # allocated and freed during the calls only show up in the peak
+    stats = after.compare_to(before, 'lineno')
+    retained_blocks = sum(max(stat.count_diff, 0) for stat in stats)
+    return peak_size - start_size, retained_blocks / calls
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the converter's hot functions")
+    parser.add_argument('-k', '--filter', help="only run the cases containing this text")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds to spend on timing each case")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    results = {}
+    print(f"{'case':<34} {'ops/sec':>12} {'peak bytes':>11} {'retained blocks/op':>19}")
+    for name, func in make_cases().items():
+        if args.filter and args.filter not in name:
+            continue
+
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            ops = measure_speed(func, args.min_time)
+            peak, retained_blocks = measure_memory(func)
+
+        results[name] = {'ops_per_sec': ops, 'peak_bytes': peak, 'retained_blocks_per_op': retained_blocks}
+        print(f"{name:<34} {ops:12.0f} {peak:11} {retained_blocks:19.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from convert import dump_files, copy_resources  # noqa: E402
+from es_items import create_default_views  # noqa: E402
+from es_reader import find_theme_xmls, find_platforms  # noqa: E402
+from qml import create_qml, create_platform_outputs  # noqa: E402
+from synthetic_theme import generate_theme  # noqa: E402
+
+
+def run_stages(theme_dir: str, out_dir: str) -> dict:
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            result = func(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    timed('find_theme_xmls', find_theme_xmls, theme_dir)
+    platforms = timed('find_platforms', find_platforms, theme_dir)
+
+    def render():
+        outputs = create_platform_outputs(platforms)
+        return create_qml('synthetic', outputs, create_default_views(theme_dir))
+
+    out_files = timed('create_qml', render)
+    timed('dump_files', dump_files, out_files, out_dir)
+    timed('copy_resources', copy_resources, out_dir)
+    return timings
+
+
+def run_benchmark(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        theme_dir = os.path.join(tmp_dir, 'theme')
+        generate_theme(theme_dir, args.platforms, args.include_depth, not args.per_platform,
+                       args.elements, args.variable_density)
+
+        for _ in range(args.repeat):
+            out_dir = os.path.join(tmp_dir, 'out')
+            # Every run starts in a new process, with empty caches
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                timings = executor.submit(run_stages, theme_dir, out_dir).result()
+            for stage, elapsed in timings.items():
+                results[stage] = min(elapsed, results.get(stage, elapsed))
+            shutil.rmtree(out_dir)
+
+    results['total'] = sum(results.values())
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+    for stage, elapsed in results.items():
+        if stage not in baseline:
+            print(f"{stage:>16}: {elapsed * 1000:9.2f} ms (no baseline)")
+            continue
+
+        ratio = elapsed / baseline[stage] if baseline[stage] else 1.0
+        status = 'ok'
+        if ratio > 1.0 + tolerance:
+            status = 'REGRESSION'
+            ok = False
+        print(f"{stage:>16}: {elapsed * 1000:9.2f} ms, {ratio:5.2f}x of baseline [{status}]")
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the conversion stages on a synthetic theme")
+    parser.add_argument('--platforms', type=int, default=100)
+    parser.add_argument('--include-depth', type=int, default=2)
+    parser.add_argument('--per-platform', action='store_true')
+    parser.add_argument('--elements', type=int, default=10)
+    parser.add_argument('--variable-density', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3, help="the fastest run of each stage is kept; "
+                        "every run is done in a new process")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare the results with this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed slowdown compared to the baseline (0.2 = 20%%)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_benchmark(args)
+
+    report = {
+        'params': {
+            'platforms': args.platforms,
+            'include_depth': args.include_depth,
+            'per_platform': args.per_platform,
+            'elements': args.elements,
+            'variable_density': args.variable_density,
+        },
+        'stages': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        if baseline.get('params') != report['params']:
+            print("Warning: the baseline was recorded with different parameters", file=sys.stderr)
+        if not compare(results, baseline['stages'], args.tolerance):
+            sys.exit(1)
+    else:
+        for stage, elapsed in results.items():
+            print(f"{stage:>16}: {elapsed * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from es_reader import replace_variables  # noqa: E402
+
+
+def replace_variables_regex(text, variables):
+    # The previous implementation, kept for comparison
+    var_pattern = re.compile('\\${(.+?)}')
+    vars_handled_later = ['system.theme', 'system.name', 'system.fullName']
+
+    var_match = var_pattern.search(text)
+    while var_match:
+        var_key = var_match.group(1)
+        if var_key in vars_handled_later:
+            var_match = var_pattern.search(text, pos=var_match.end())
+            continue
+
+        var_value = ''
+        if var_key in variables:
+            var_value = variables[var_key]
+
+        text = text[:var_match.start()] + var_value + text[var_match.end():]
+        var_match = var_pattern.search(text, pos=var_match.start() + len(var_value))
+
+    return text
+
+
+def make_cases():
+    variables = {f'var{idx}': f'value_{idx}' for idx in range(50)}
+    texts = [
+        'FFFFFF',
+        '0.5 0.25',
+        './art/${system.theme}/logo.svg',
+        '${var1}',
+        '${var2}${var3}',
+        'prefix ${var4} middle ${system.name} suffix ${var5}',
+        ' '.join(f'${{var{idx % 50}}}' for idx in range(200)),
+    ]
+    return texts, variables
+
+
+def main():
+    texts, variables = make_cases()
+    for text in texts:
+        assert replace_variables(text, variables) == replace_variables_regex(text, variables)
+
+    rounds = 2000
+    for name, func in [('regex', replace_variables_regex), ('compiled', replace_variables)]:
+        elapsed = min(timeit.repeat(lambda: [func(t, variables) for t in texts], number=rounds, repeat=5))
+        print(f"{name:>10}: {rounds * len(texts) / elapsed:12.0f} calls/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+
+import argparse
+import os
+import random
+
+from typing import List
+
+
+# element type -> (property, value kind)
+ELEMENT_TEMPLATES = [
+    ('image', [('pos', 'pair'), ('size', 'pair'), ('path', 'path'), ('color', 'color')]),
+    ('text', [('pos', 'pair'), ('size', 'pair'), ('text', 'text'), ('color', 'color'),
+              ('fontSize', 'float'), ('alignment', 'alignment')]),
+]
+
+
+class Generator():
+    def __init__(self, seed: int, variable_density: float):
+        self.rng = random.Random(seed)
+        self.variable_density = variable_density
+        self.variables = {}
+
+    def value(self, kind: str) -> str:
+        if kind == 'pair':
+            value = f"{self.rng.randint(0, 100) / 100} {self.rng.randint(0, 100) / 100}"
+        elif kind == 'color':
+            value = f"{self.rng.randint(0, 0xFFFFFF):06X}"
+        elif kind == 'float':
+            value = f"{self.rng.randint(20, 90) / 1000}"
+        elif kind == 'alignment':
+            value = self.rng.choice(['left', 'center', 'right'])
+        elif kind == 'path':
+            value = f"./art/image{self.rng.randint(0, 9)}.png"
+        else:
+            value = f"Some text {self.rng.randint(0, 1000)} for ${{system.name}}"
+
+        if self.rng.random() < self.variable_density:
+            var_name = f"{kind}Var{len(self.variables)}"
+            self.variables[var_name] = value
+            return f"${{{var_name}}}"
+        return value
+
+    def element(self, idx: int) -> str:
+        elemtype, props = ELEMENT_TEMPLATES[idx % len(ELEMENT_TEMPLATES)]
+        lines = [f'    <{elemtype} name="extra{idx}" extra="true">']
+        for prop, kind in props:
+            lines.append(f'      <{prop}>{self.value(kind)}</{prop}>')
+        lines.append(f'    </{elemtype}>')
+        return '\n'.join(lines)
+
+    def theme_xml(self, includes: List[str], element_count: int, format_version: bool) -> str:
+        self.variables = {}
+        elems = [self.element(idx) for idx in range(element_count)]
+        lines = ['<theme>']
+        if format_version:
+            lines.append('  <formatVersion>4</formatVersion>')
+        lines.extend(f'  <include>{path}</include>' for path in includes)
+        if self.variables:
+            lines.append('  <variables>')
+            lines.extend(f'    <{k}>{v}</{k}>' for k, v in self.variables.items())
+            lines.append('  </variables>')
+        lines.append('  <view name="system, basic, detailed">')
+        lines.extend(elems)
+        lines.append('  </view>')
+        lines.append('</theme>')
+        return '\n'.join(lines) + '\n'
+
+
+def write_file(path: str, contents: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(contents)
+
+
+def generate_theme(out_dir: str, platforms: int = 50, include_depth: int = 2, shared: bool = True,
+                   elements: int = 10, variable_density: float = 0.3, seed: int = 0):
+    gen = Generator(seed, variable_density)
+
+    # the shared include chain: common/level0.xml -> common/level1.xml -> ...
+    for level in range(include_depth if shared else 0):
+        includes = [f'./level{level + 1}.xml'] if level + 1 < include_depth else []
+        write_file(os.path.join(out_dir, 'common', f'level{level}.xml'),
+                   gen.theme_xml(includes, elements, format_version=False))
+
+    for idx in range(platforms):
+        platform_dir = os.path.join(out_dir, f'platform{idx:03}')
+        includes = []
+        if include_depth:
+            if shared:
+                includes = ['../common/level0.xml']
+            else:
+                for level in range(include_depth):
+                    own_includes = [f'./level{level + 1}.xml'] if level + 1 < include_depth else []
+                    write_file(os.path.join(platform_dir, f'level{level}.xml'),
+                               gen.theme_xml(own_includes, elements, format_version=False))
+                includes = ['./level0.xml']
+
+        write_file(os.path.join(platform_dir, 'theme.xml'),
+                   gen.theme_xml(includes, elements, format_version=True))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ES theme for benchmarking")
+    parser.add_argument('OUTPUTDIR', help="directory where the theme should be generated")
+    parser.add_argument('--platforms', type=int, default=50, help="number of platform directories")
+    parser.add_argument('--include-depth', type=int, default=2, help="length of the include chain")
+    parser.add_argument('--per-platform', action='store_true', help="give every platform its own includes")
+    parser.add_argument('--elements', type=int, default=10, help="extra elements per view, per XML")
+    parser.add_argument('--variable-density', type=float, default=0.3,
+                        help="ratio of property values set through variables")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    generate_theme(args.OUTPUTDIR, args.platforms, args.include_depth, not args.per_platform,
+                   args.elements, args.variable_density, args.seed)
+
+
+if __name__ == "__main__":
+    main()
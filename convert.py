@@ -2,14 +2,25 @@
 
 import argparse
 import os
+import shutil
 import sys
-from distutils.dir_util import copy_tree
-from typing import Dict
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Dict, List, Optional, Set
 
-from errors import print_info
-from qml import create_qml
-from es_reader import find_platforms
-from es_items import create_default_views
+from errors import print_info, add_diagnostics, print_diagnostics_summary, write_diagnostics_report
+from qml import create_qml, render_platform, add_render_results, apply_render_settings, \
+    PlatformOutput, QmlStream
+from es_reader import LOW_MEMORY_XML_CACHE_SIZE, find_theme_xmls, iter_platforms
+from es_items import create_default_views, create_default_view_template
+from image_size import build_asset_index, parse_resolution, set_asset_index
+from qml_optimize import print_binding_report, print_removed_items_report
+from manifest import load_manifest, get_platform_entries, get_generated_files, find_up_to_date_platforms, \
+    invalidate_manifest, save_manifest
+from memreport import enable_memory_report, memory_stage, print_memory_report
+from tracing import enable_tracing, span, traced, write_trace
 
 
 def print_systems(ui_platforms):
@@ -30,76 +41,414 @@ def print_systems(ui_platforms):
         break
 
 
-def has_structural_similarity(ui_platforms):
-    if not ui_platforms:
+HASHMARK_HEADER = \
+    "# Autogenerated content, do not edit by hand!\n" + \
+    "# converter v0.1.0\n" + \
+    "\n"
+# "# " + str(datetime.now()) + "\n" + \
+QML_HEADER = HASHMARK_HEADER.replace('#', '//')
+
+
+def is_generated_file(path: str) -> bool:
+    header_starts = [HASHMARK_HEADER.split('\n')[0], QML_HEADER.split('\n')[0]]
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.readline().rstrip('\n') in header_starts
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def is_same_file(path: str, data: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as file:
+            return file.read() == data
+    except OSError:
+        return False
+
+
+def default_file_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_atomic(path: str, data: bytes, mode: int):
+    # mkstemp creates private files, so the usual permissions are set manually
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_stale_files(out_root: str, stale_files) -> int:
+    # Only the files the previous run recorded as generated are removed,
+    # along with the directories they leave empty
+    removed = 0
+    for relpath in sorted(stale_files):
+        relpath = os.path.normpath(relpath)
+        if os.path.isabs(relpath) or relpath.split(os.sep)[0] in ('..', '__es_resources'):
+            continue
+
+        path = os.path.join(out_root, relpath)
+        if not os.path.isfile(path) or not is_generated_file(path):
+            continue
+        os.remove(path)
+        removed += 1
+
+        dirname = os.path.dirname(relpath)
+        while dirname:
+            try:
+                os.rmdir(os.path.join(out_root, dirname))
+            except OSError:
+                break  # not empty
+            dirname = os.path.dirname(dirname)
+
+    return removed
+
+
+class OutputWriter():
+    def __init__(self, out_root: str, previous_files=()):
+        self.out_root = out_root
+        self.previous_files = previous_files
+        self.written = 0
+        self.skipped = 0
+        self.created_dirs: Set[str] = set()
+        self.generated_files: Set[str] = set()
+        self.file_mode = default_file_mode()
+
+    def write(self, relpath: str, contents: str):
+        actual_path = os.path.join(self.out_root, relpath)
+        self.generated_files.add(relpath)
+
+        if actual_path.endswith('.qml') or actual_path.endswith('.js'):
+            data = (QML_HEADER + contents).encode('utf-8')
+        else:
+            data = (HASHMARK_HEADER + contents).encode('utf-8')
+
+        with span('write_file', path=relpath):
+            if is_same_file(actual_path, data):
+                self.skipped += 1
+                return
+
+            dirname = os.path.dirname(actual_path)
+            if dirname not in self.created_dirs:
+                os.makedirs(dirname, exist_ok=True)
+                self.created_dirs.add(dirname)
+
+            write_atomic(actual_path, data, self.file_mode)
+            self.written += 1
+
+    def finish(self):
+        stale_files = set(self.previous_files) - self.generated_files
+        removed = remove_stale_files(self.out_root, stale_files)
+        print_info(f"{self.written} files written, {self.skipped} unchanged, {removed} removed")
+
+
+def dump_files(files: Dict[str, str], out_root: str, previous_files=()) -> Set[str]:
+    writer = OutputWriter(out_root, previous_files)
+    for relpath, contents in files.items():
+        writer.write(relpath, contents)
+    writer.finish()
+    return writer.generated_files
+
+
+FICLONE = 0x40049409  # from linux/fs.h
+
+
+def is_synced(src: str, dst: str) -> bool:
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+
+    if os.path.samestat(src_stat, dst_stat):
+        return True
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
         return True
 
-    for system in ui_platforms:
-        for viewtype, elems in system['views'].items():
-            if viewtype not in ui_platforms[0]['views']:
-                print_info(f"{system['name']}: {viewtype} not in {ui_platforms[0]['views'].keys()}")
-                return False
-            if len(elems) != len(ui_platforms[0]['views'][viewtype]):
-                print_info(f"{system['name']}: {len(elems)} != {len(ui_platforms[0]['views'][viewtype])}")
-                return False
-            for idx, _ in enumerate(elems):
-                if elems[idx]['type'] != ui_platforms[0]['views'][viewtype][idx]['type']:
-                    print_info(f"{system['name']}: at idx {idx} {elems[idx]['type']} != {ui_platforms[0]['views'][viewtype][idx]['type']}")
-                    return False
+    with open(src, 'rb') as src_file, open(dst, 'rb') as dst_file:
+        if src_file.read() != dst_file.read():
+            return False
 
+    # same contents, avoid comparing again next time
+    os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
     return True
 
 
-def dump_files(files: Dict[str, str], out_root: str):
-    hashmark_header = \
-        "# Autogenerated content, do not edit by hand!\n" + \
-        "# converter v0.1.0\n" + \
-        "\n"
-    # "# " + str(datetime.now()) + "\n" + \
-    qml_header = hashmark_header.replace('#', '//')
+def reflink_file(src: str, dst: str):
+    import fcntl
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dst)
 
-    idx_cur = 0
-    # idx_max = len(out_files)
-    for relpath, contents in files.items():
-        actual_path = os.path.join(out_root, relpath)
-        os.makedirs(os.path.dirname(actual_path), exist_ok=True)
-        with open(actual_path, 'wt') as file:
-            # print(f"[{idx_cur + 1:3}/{idx_max:3}] Writing `{actual_path}`...")
-            if actual_path.endswith('.qml') or actual_path.endswith('.js'):
-                file.write(qml_header)
-            else:
-                file.write(hashmark_header)
-            file.write(contents)
-        idx_cur += 1
-
-
-def copy_resources(targetdir: str):
+
+def sync_file(src: str, dst: str, link_mode: str) -> bool:
+    if is_synced(src, dst):
+        return False
+
+    if link_mode != 'copy' and os.path.lexists(dst):
+        os.remove(dst)
+
+    try:
+        if link_mode == 'hardlink':
+            os.link(src, dst)
+            return True
+        if link_mode == 'reflink':
+            reflink_file(src, dst)
+            return True
+    except (OSError, ImportError):
+        pass  # not supported by the file system or the OS, fall back to copying
+
+    shutil.copy2(src, dst)
+    return True
+
+
+def sync_dir(src_root: str, dst_root: str, link_mode: str = 'copy', jobs: int = 4) -> int:
+    tasks = []
+    for dirpath, _, filenames in os.walk(src_root):
+        target_dir = os.path.join(dst_root, os.path.relpath(dirpath, src_root))
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            tasks.append((os.path.join(dirpath, filename), os.path.join(target_dir, filename)))
+
+    with ThreadPoolExecutor(jobs) as executor:
+        results = executor.map(lambda task: sync_file(*task, link_mode), tasks)
+        return sum(results)
+
+
+@traced
+def copy_resources(targetdir: str, link_mode: str = 'copy'):
     dirname = '__es_resources'
-    copy_tree(sys.path[0] + '/' + dirname, targetdir + '/' + dirname)
+    copied = sync_dir(os.path.join(sys.path[0], dirname), os.path.join(targetdir, dirname), link_mode)
+    print_info(f"{copied} resource files updated")
+
+
+@contextmanager
+def stage(name: str, variant_name: Optional[str] = None):
+    # The stages repeated for every output variant are labeled with it
+    label = f"{name} ({variant_name})" if variant_name else name
+    with span(label), memory_stage(label):
+        yield
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('INPUTDIR', help="directory of the ES theme")
     parser.add_argument('OUTPUTDIR', help="directory where generated content should be written", nargs='?')
+    parser.add_argument('--link-resources', help="how to place the resource files in the output directory",
+                        choices=['copy', 'hardlink', 'reflink'], default='copy')
+    parser.add_argument('--rebuild', help="convert every platform, even if they didn't change", action='store_true')
+    parser.add_argument('--trace', help="write a timeline of the conversion to this file, "
+                        "in Chrome's trace event format", metavar='TRACE_JSON')
+    parser.add_argument('--low-memory', help="write every platform before reading the next one; "
+                        "similar views are not merged and --rebuild is implied", action='store_true')
+    parser.add_argument('--diagnostics', help="write every warning and error with their number of occurrences "
+                        "to this JSON file")
+    parser.add_argument('--mem-report', help="print the memory usage of the conversion stages", action='store_true')
+    parser.add_argument('--target', help="screen size of the device the theme is made for; the positions and "
+                        "sizes are written as pixel values instead of bindings. Can be used more than once, "
+                        "in which case every target is written to a WxH subdirectory of the output",
+                        type=parse_resolution, metavar='WxH', action='append', default=[])
+    parser.add_argument('--image-resolution', help="screen size used to limit the decoded size of the images, "
+                        "by setting their sourceSize (default: the target when there are several, otherwise "
+                        "none, the images load at their full size)",
+                        type=parse_resolution, default=None, metavar='WxH')
+    parser.add_argument('--no-optimize', help="write the views as they are read, without removing the hidden "
+                        "items or simplifying the bindings", action='store_true')
+    parser.add_argument('-j', '--jobs', help="number of platforms to convert in parallel", type=int, default=1)
+    parser.add_argument('--io-jobs', help="number of theme XMLs to read from the disk in parallel "
+                        "(use 1 to read them only when needed; not used with --low-memory)", type=int, default=4)
     # parser.add_argument('-v', '--verbose', help="verbose output", action='store_true')
     return parser.parse_args()
 
 
+class OutputVariant():
+    def __init__(self, name: str, out_dir: Optional[str], layout_target, image_resolution, optimize: bool):
+        self.name = name
+        self.out_dir = out_dir
+        self.settings = (layout_target, image_resolution, optimize)
+        self.manifest_entries: Dict[str, dict] = {}
+        self.previous_files: List[str] = []
+        self.cached_outputs: Dict[str, PlatformOutput] = {}
+
+    def render_options(self) -> dict:
+        # The options that change the generated files
+        layout_target, image_resolution, optimize = self.settings
+        return {
+            'image_resolution': list(image_resolution) if image_resolution else None,
+            'target': list(layout_target) if layout_target else None,
+            'optimize': optimize,
+        }
+
+
+def create_variants(args) -> List[OutputVariant]:
+    targets = args.target or [None]
+    variants = []
+    for target in targets:
+        name = f"{target[0]}x{target[1]}" if target else 'default'
+        out_dir = args.OUTPUTDIR
+        if out_dir and len(targets) > 1:
+            out_dir = os.path.join(out_dir, name)
+        # Every device class gets the images at its own resolution
+        image_resolution = args.image_resolution or (target if len(targets) > 1 else None)
+        variants.append(OutputVariant(name, out_dir, target, image_resolution, not args.no_optimize))
+    return variants
+
+
+def init_worker(trace: bool, mem_report: bool, asset_index):
+    enable_tracing(trace)
+    enable_memory_report(mem_report)
+    if asset_index is not None:
+        set_asset_index(asset_index)
+
+
+def convert_in_memory(args, theme_name: str, variants: List[OutputVariant], executor):
+    # The platforms are read once and rendered for every variant
+    theme_xmls = find_theme_xmls(args.INPUTDIR)
+
+    manifests: Dict[str, dict] = {}
+    for variant in variants:
+        if variant.out_dir:
+            with span('load_manifest'):
+                manifest = load_manifest(variant.out_dir)
+            manifests[variant.name] = manifest
+            variant.previous_files = get_generated_files(manifest)
+            if not args.rebuild:
+                variant.manifest_entries = get_platform_entries(manifest, args.INPUTDIR, variant.render_options())
+        with span('find_up_to_date_platforms'):
+            variant.cached_outputs = find_up_to_date_platforms(variant.manifest_entries, theme_xmls)
+    skipped_platforms = set.intersection(*(set(variant.cached_outputs) for variant in variants))
+    skipped_unsupported_elems: Set[str] = set()
+    for platform_name in sorted(skipped_platforms):
+        print_info(f"Platform `{platform_name}` is up to date")
+        cached_output = variants[0].cached_outputs[platform_name]
+        add_diagnostics(cached_output.diagnostics)
+        skipped_unsupported_elems.update(cached_output.unsupported_elems)
+
+    # Every platform is read and rendered in the same task, and only its
+    # outputs are kept, so the find_platforms stage includes the rendering
+    process = partial(render_platform, [variant.settings for variant in variants])
+    with stage('find_platforms'):
+        rendered = [add_render_results(result)
+                    for result in iter_platforms(args.INPUTDIR, executor, skipped_platforms=skipped_platforms,
+                                                 io_jobs=args.io_jobs, process=process,
+                                                 skipped_unsupported_elems=skipped_unsupported_elems)]
+    default_views = create_default_views(args.INPUTDIR)
+
+    all_outputs: List[PlatformOutput] = []
+    for idx, variant in enumerate(variants):
+        variant_name = None
+        if len(variants) > 1:
+            variant_name = variant.name
+            print_info(f"Creating the `{variant.name}` variant...")
+        apply_render_settings(variant.settings)
+
+        outputs = [platform_outputs[idx] for platform_outputs in rendered]
+        rendered_names = {output.name for output in outputs}
+        outputs.extend(output for name, output in variant.cached_outputs.items() if name not in rendered_names)
+        outputs.sort(key=lambda output: output.name)
+        all_outputs.extend(outputs)
+
+        with stage('create_qml', variant_name):
+            out_files = create_qml(theme_name, outputs, default_views)
+        if variant.out_dir:
+            print_info("Writing files...")
+            # The manifest is only valid again after every file is written
+            invalidate_manifest(variant.out_dir, manifests[variant.name])
+            with stage('dump_files', variant_name):
+                generated_files = dump_files(out_files, variant.out_dir, variant.previous_files)
+            copy_resources(variant.out_dir, args.link_resources)
+            with span('save_manifest', variant=variant.name):
+                save_manifest(variant.out_dir, args.INPUTDIR, variant.render_options(), theme_xmls,
+                              outputs, variant.manifest_entries, generated_files)
+
+    print_memory_report(all_outputs, create_default_view_template(args.INPUTDIR))
+
+
+def convert_low_memory(args, theme_name: str, variants: List[OutputVariant], executor):
+    # Every platform is parsed, rendered and written before the next one,
+    # so the memory use doesn't depend on the number of platforms
+    default_views = create_default_views(args.INPUTDIR)
+    writers = []
+    streams = []
+    for variant in variants:
+        writer = None
+        if variant.out_dir:
+            manifest = load_manifest(variant.out_dir)
+            # The manifest is only valid again after every file is written
+            invalidate_manifest(variant.out_dir, manifest)
+            writer = OutputWriter(variant.out_dir, get_generated_files(manifest))
+        write_file = writer.write if writer else lambda relpath, contents: None
+        writers.append(writer)
+        streams.append(QmlStream(theme_name, default_views, write_file))
+
+    # Like in the in-memory mode, the platforms are rendered where they're
+    # read, in parallel with --jobs. The files are not prefetched, as that
+    # would read them whole instead of in chunks.
+    process = partial(render_platform, [variant.settings for variant in variants])
+    with stage('create_qml_streaming'):
+        for result in iter_platforms(args.INPUTDIR, executor, io_jobs=1, process=process,
+                                     cache_size=LOW_MEMORY_XML_CACHE_SIZE):
+            for stream, output in zip(streams, add_render_results(result)):
+                stream.add_platform(output)
+        for variant, stream in zip(variants, streams):
+            apply_render_settings(variant.settings)
+            stream.finish()
+
+    for variant, writer in zip(variants, writers):
+        if writer:
+            writer.finish()
+            copy_resources(variant.out_dir, args.link_resources)
+            # Nothing is cached in this mode, only the list of the generated files is kept
+            save_manifest(variant.out_dir, args.INPUTDIR, variant.render_options(), {}, [], {},
+                          writer.generated_files)
+
+    print_memory_report([], create_default_view_template(args.INPUTDIR))
+
+
 def main():
     args = parse_args()
+    enable_tracing(bool(args.trace))
+    enable_memory_report(args.mem_report)
 
     theme_name = os.path.basename(os.path.abspath(args.INPUTDIR))
-    platforms = find_platforms(args.INPUTDIR)
-    default_views = create_default_views(args.INPUTDIR)
+    variants = create_variants(args)
+    # Only used to read the sizes of the images
+    asset_index = None
+    if any(image_resolution for _, image_resolution, _ in (variant.settings for variant in variants)):
+        with span('build_asset_index'):
+            asset_index = build_asset_index(args.INPUTDIR)
+        set_asset_index(asset_index)
 
-    out_files = create_qml(theme_name, platforms, default_views)
-    if args.OUTPUTDIR:
-        print_info("Writing files...")
-        dump_files(out_files, args.OUTPUTDIR)
-        copy_resources(args.OUTPUTDIR)
+    initargs = (bool(args.trace), args.mem_report, asset_index)
+    pool = ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=initargs) \
+        if args.jobs > 1 else nullcontext()
+    with pool as executor:
+        if args.low_memory:
+            convert_low_memory(args, theme_name, variants, executor)
+        else:
+            convert_in_memory(args, theme_name, variants, executor)
 
-    # print(has_structural_similarity(ui_platforms))
+    print_removed_items_report()
+    print_binding_report()
+    print_diagnostics_summary()
+    if args.diagnostics:
+        write_diagnostics_report(args.diagnostics)
+    if args.trace:
+        write_trace(args.trace)
 
 
 if __name__ == "__main__":
@@ -1,26 +1,155 @@
+import io
+import json
+import os
 import sys
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+
+@lru_cache(maxsize=8)
+def fd_can_color(fd: int) -> bool:
+    return sys.platform != 'win32' and os.isatty(fd)
+
+
+def stream_can_color(stream) -> bool:
+    # Cached by file descriptor, so the streams themselves aren't kept alive
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.platform != 'win32' and stream.isatty()
+    return fd_can_color(fd)
 
 
 def term_can_color():
-    return sys.platform != 'win32' and sys.stdout.isatty()
+    return stream_can_color(sys.stdout)
+
+
+class CapturedOutput(io.StringIO):
+    def __init__(self, isatty: bool):
+        super().__init__()
+        self.is_terminal = isatty
+
+    def isatty(self):
+        return self.is_terminal
+
+
+class Diagnostic():
+    def __init__(self, level: str, msg: str):
+        self.level = level
+        self.msg = msg
+        self.count = 0
+        # Every distinct location, in the order they were reported
+        self.locations: Dict[str, None] = {}
+
+
+# Only the first occurrence of a message is printed, the rest are counted
+DIAGNOSTICS: Dict[Tuple[str, str], Diagnostic] = {}
+# Worker processes send their messages back instead of printing them
+BUFFERED_DIAGNOSTICS: List[Tuple[str, str, Optional[str]]] = []
+DIAGNOSTICS_BUFFERED = False
+# The lists every message is also added to, see record_diagnostics
+RECORDED_DIAGNOSTICS: List[List[Tuple[str, str, Optional[str]]]] = []
+# Only printed to the console, the JSON report has every location
+MAX_SAMPLE_LOCATIONS = 3
+
+LEVEL_COLORS = {
+    'warning': '\033[93m',
+    'error': '\033[91m',
+}
+
+
+def buffer_diagnostics(enabled: bool = True):
+    global DIAGNOSTICS_BUFFERED
+    DIAGNOSTICS_BUFFERED = enabled
+
+
+def take_diagnostics() -> List[Tuple[str, str, Optional[str]]]:
+    records = BUFFERED_DIAGNOSTICS[:]
+    BUFFERED_DIAGNOSTICS.clear()
+    return records
+
+
+def add_diagnostics(records: List[Tuple[str, str, Optional[str]]]):
+    for level, msg, location in records:
+        report(level, msg, location)
+
+
+@contextmanager
+def record_diagnostics():
+    # Yields the list of the messages reported in the block, which are
+    # still printed or buffered as usual
+    records: List[Tuple[str, str, Optional[str]]] = []
+    RECORDED_DIAGNOSTICS.append(records)
+    try:
+        yield records
+    finally:
+        RECORDED_DIAGNOSTICS.remove(records)
+
+
+def print_message(level: str, msg: str):
+    can_color = term_can_color()
+    COLOR_START = LEVEL_COLORS[level] if can_color else ''
+    COLOR_END = '\033[0m' if can_color else ''
+    print(f'{COLOR_START}[{level}] {msg}{COLOR_END}', file=sys.stderr)
+
+
+def report(level: str, msg: str, location: Optional[str] = None):
+    for records in RECORDED_DIAGNOSTICS:
+        records.append((level, msg, location))
+    if DIAGNOSTICS_BUFFERED:
+        BUFFERED_DIAGNOSTICS.append((level, msg, location))
+        return
+
+    entry = DIAGNOSTICS.get((level, msg))
+    if not entry:
+        entry = Diagnostic(level, msg)
+        DIAGNOSTICS[(level, msg)] = entry
+        print_message(level, f'{location}: {msg}' if location else msg)
+
+    entry.count += 1
+    if location:
+        entry.locations[location] = None
 
 
 def print_info(msg):
     print(f'[i] {msg}')
 
 
-def warn(msg):
-    COLOR_START = '\033[93m' if term_can_color() else ''
-    COLOR_END = '\033[0m' if term_can_color() else ''
-    print(f'{COLOR_START}[warning] {msg}{COLOR_END}', file=sys.stderr)
+def warn(msg, location: Optional[str] = None):
+    report('warning', str(msg), location)
+
+
+def print_error(msg, location: Optional[str] = None):
+    report('error', str(msg), location)
+
+
+def print_diagnostics_summary():
+    repeated = [entry for entry in DIAGNOSTICS.values() if entry.count > 1]
+    if not repeated:
+        return
+
+    print_info("Repeated messages:")
+    for entry in sorted(repeated, key=lambda entry: -entry.count):
+        print_info(f"  - {entry.count}x [{entry.level}] {entry.msg}")
+        locations = list(entry.locations)
+        for location in locations[:MAX_SAMPLE_LOCATIONS]:
+            print_info(f"      in {location}")
+        if len(locations) > MAX_SAMPLE_LOCATIONS:
+            print_info(f"      and {len(locations) - MAX_SAMPLE_LOCATIONS} more")
 
 
-def print_error(msg):
-    COLOR_START = '\033[91m' if term_can_color() else ''
-    COLOR_END = '\033[0m' if term_can_color() else ''
-    print(f'{COLOR_START}[error] {msg}{COLOR_END}', file=sys.stderr)
+def write_diagnostics_report(path: str):
+    report_entries = [{
+        'level': entry.level,
+        'message': entry.msg,
+        'count': entry.count,
+        'locations': list(entry.locations),
+    } for entry in DIAGNOSTICS.values()]
+    with open(path, 'w') as file:
+        json.dump(report_entries, file, indent=2)
 
 
 def error_and_die(msg):
-    print_error(msg)
+    print_message('error', str(msg))
     sys.exit(1)
@@ -1,20 +1,40 @@
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
 from property_types import parse_param, Property
 from static import KNOWN_ELEMENTS
+from tracing import traced
 
 
 class Platform():
-    def __init__(self, name, views):
+    __slots__ = ('name', 'views', 'deps', 'unsupported_elems', 'diagnostics')
+
+    def __init__(self, name, views, deps=None, unsupported_elems=None, diagnostics=None):
         self.name = name
         self.views = views
+        # Every theme XML and asset file this platform was created from -> the hash of its contents
+        self.deps: Dict[str, Optional[str]] = deps if deps else {}
+        self.unsupported_elems: Set[str] = unsupported_elems if unsupported_elems else set()
+        # The warnings and errors reported while reading it
+        self.diagnostics: List[Tuple[str, str, Optional[str]]] = diagnostics if diagnostics else []
 
 
 class Element():
+    __slots__ = ('name', 'type', 'is_extra', 'params', 'is_shared')
+
     def __init__(self, name, typename):
         self.name = name
         self.type = typename
         self.is_extra = False
         self.params: Dict[str, Property] = {}
+        # Shared elements are part of the default view template
+        # and must be copied before modification
+        self.is_shared = False
+
+    def copy(self):
+        elem = Element(self.name, self.type)
+        elem.is_extra = self.is_extra
+        elem.params = self.params
+        return elem
 
     def __repr__(self):
         return f"{self.type} {self.name}, is_extra={self.is_extra}, params=[{','.join(self.params)}]"
@@ -197,7 +217,9 @@ DEFAULT_PROPS[('*', 'datetime', '*')] = {
 }
 
 
-def create_default_views(root_dir: str) -> Dict[str, Dict[str, Element]]:
+@lru_cache(maxsize=None)
+@traced
+def create_default_view_template(root_dir: str) -> Dict[str, Dict[str, Element]]:
     views: Dict[str, Dict[str, Element]] = {}
     for viewname in DEFAULT_VIEW_ITEMS:
         views[viewname] = {}
@@ -214,7 +236,7 @@ def create_default_views(root_dir: str) -> Dict[str, Dict[str, Element]]:
             for key in prop_keys:
                 str_props.update(DEFAULT_PROPS.get(key, {}))
 
-            views[viewname][itemname] = Element(itemname, itemtype)
+            elem = Element(itemname, itemtype)
             for propname, propval in str_props.items():
                 proptype = KNOWN_ELEMENTS[itemtype].get(propname)
                 if not proptype:
@@ -224,6 +246,14 @@ def create_default_views(root_dir: str) -> Dict[str, Dict[str, Element]]:
 
                 prop = parse_param(root_dir, proptype, propval)
                 assert(prop is not None)
-                views[viewname][itemname].params[propname] = prop
+                elem.params[propname] = prop
+
+            elem.is_shared = True
+            views[viewname][itemname] = elem
 
     return views
+
+
+def create_default_views(root_dir: str) -> Dict[str, Dict[str, Element]]:
+    template = create_default_view_template(root_dir)
+    return {viewname: dict(elems) for viewname, elems in template.items()}
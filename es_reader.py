@@ -1,12 +1,22 @@
+import hashlib
+import io
 import os
 import re
+import sys
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Set
-
-from errors import print_info, print_error, warn
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout, redirect_stderr
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from errors import CapturedOutput, print_info, print_error, warn, term_can_color, \
+    buffer_diagnostics, take_diagnostics, add_diagnostics, record_diagnostics
 from es_items import Platform, Element, create_default_views
-from property_types import parse_param, Property
-from static import KNOWN_ELEMENTS, RESERVED_ITEMS, RESTRICTED_TYPES, MAX_FORMAT_VERSION
+from memreport import add_cache_stats, add_worker_peak, start_worker_task, take_worker_peak
+from property_types import parse_param, parse_cache_stats, Property
+from static import KNOWN_ELEMENTS, RESERVED_ITEMS, RESTRICTED_TYPES, MAX_FORMAT_VERSION, PropType
+from tracing import span, traced, take_events, add_events
 
 
 def check_format_version(xml_path: str, root: ET.Element):
@@ -16,37 +26,45 @@ def check_format_version(xml_path: str, root: ET.Element):
 
     text = node.text.strip() if node.text else None
     if not text:
-        warn(f"{xml_path}: The <formatVersion> is empty")
+        warn("The <formatVersion> is empty", xml_path)
         return
 
     try:
         version = int(text)
     except ValueError:
-        warn(f"{xml_path}: The <formatVersion> seems to be an invalid number")
+        warn("The <formatVersion> seems to be an invalid number", xml_path)
 
     if version > MAX_FORMAT_VERSION:
-        warn(f"{xml_path}: This theme may use features not yet supported")
+        warn("This theme may use features not yet supported", xml_path)
 
 
-def replace_variables(text, variables):
-    var_pattern = re.compile('\\${(.+?)}')
-    vars_handled_later = ['system.theme', 'system.name', 'system.fullName']
-
-    var_match = var_pattern.search(text)
-    while var_match:
-        var_key = var_match.group(1)
-        if var_key in vars_handled_later:
-            var_match = var_pattern.search(text, pos=var_match.end())
-            continue
+VARIABLE_PATTERN = re.compile(r'\${(.+?)}')
+VARIABLES_HANDLED_LATER = {'system.theme', 'system.name', 'system.fullName'}
+
 
-        var_value = ''
-        if var_key in variables:
-            var_value = variables[var_key]
+@lru_cache(maxsize=4096)
+def compile_variables(text: str) -> Tuple[str, ...]:
+    # Even indices are literal text, odd indices are variable names
+    parts = VARIABLE_PATTERN.split(text)
 
-        text = text[:var_match.start()] + var_value + text[var_match.end():]
-        var_match = var_pattern.search(text, pos=var_match.start() + len(var_value))
+    compiled = [parts[0]]
+    for idx in range(1, len(parts), 2):
+        var_key, literal = parts[idx], parts[idx + 1]
+        if var_key in VARIABLES_HANDLED_LATER:
+            compiled[-1] += '${' + var_key + '}' + literal
+        else:
+            compiled.extend([var_key, literal])
+
+    return tuple(compiled)
+
+
+def replace_variables(text, variables):
+    parts = compile_variables(text)
+    if len(parts) == 1:
+        return parts[0]
 
-    return text
+    return ''.join(part if idx % 2 == 0 else variables.get(part, '')
+                   for idx, part in enumerate(parts))
 
 
 def parse_view_item_property(curr_dir: str, variables: Dict[str, str], itemtype: str, param: ET.Element) -> Property:
@@ -70,6 +88,7 @@ def parse_view_item_property(curr_dir: str, variables: Dict[str, str], itemtype:
     return param_obj
 
 
+@traced
 def read_view(xml_path, variables, viewname, viewnode, view) -> Set[str]:
     unsupported_elems = set()
     reserved_view_items = RESERVED_ITEMS.get(viewname, {})
@@ -89,13 +108,13 @@ def read_view(xml_path, variables, viewname, viewnode, view) -> Set[str]:
             continue
 
         if 'name' not in element.attrib:
-            warn(f"{xml_path}: A `{element.tag}` element has no `name` field")
+            warn(f"A `{element.tag}` element has no `name` field", xml_path)
             continue
 
         affected_items = [s.strip() for s in re.split(r',\s*', element.attrib['name'])]
         affected_items = list(filter(None, affected_items))
         if not affected_items:
-            warn(f"{xml_path}: A `{element.tag}` element's `name` field has no items")
+            warn(f"A `{element.tag}` element's `name` field has no items", xml_path)
             continue
 
         is_extra = 'extra' in element.attrib
@@ -104,7 +123,7 @@ def read_view(xml_path, variables, viewname, viewnode, view) -> Set[str]:
             try:
                 found_params[param.tag] = parse_view_item_property(curr_dir, variables, element.tag, param)
             except ValueError as e:
-                warn(f"{xml_path}: {e}")
+                warn(e, xml_path)
                 continue
 
         for itemname in affected_items:
@@ -112,30 +131,33 @@ def read_view(xml_path, variables, viewname, viewnode, view) -> Set[str]:
             really_extra = expected_type is None
 
             if expected_type and expected_type != element.tag:
-                warn(f"{xml_path}: In `{viewname}` views `{itemname}` is a known element with type "
+                warn(f"In `{viewname}` views `{itemname}` is a known element with type "
                      f"`{expected_type}`, but here it is declared as `{element.tag}`. "
-                     "Ignoring the properties.")
+                     "Ignoring the properties.", xml_path)
                 continue
 
             if is_extra and not really_extra:
-                warn(f"{xml_path}: In `{viewname}` views `{itemname}` is a known non-extra element, "
-                     "but it is marked as an extra here. Ignoring the extra setting.")
+                warn(f"In `{viewname}` views `{itemname}` is a known non-extra element, "
+                     "but it is marked as an extra here. Ignoring the extra setting.", xml_path)
             if not is_extra and really_extra:
-                warn(f"{xml_path}: In `{viewname}` views `{itemname}` is not a known element "
-                     "and should be marked as extra, but it isn't. Marking it as one.")
+                warn(f"In `{viewname}` views `{itemname}` is not a known element "
+                     "and should be marked as extra, but it isn't. Marking it as one.", xml_path)
 
             if really_extra and element.tag in RESTRICTED_TYPES:
-                warn(f"{xml_path}: `{element.tag}` items cannot be created as an extra element, "
-                     "because they don't have anything to display on their own")
+                warn(f"`{element.tag}` items cannot be created as an extra element, "
+                     "because they don't have anything to display on their own", xml_path)
                 continue
 
             item = view.setdefault(itemname, Element(itemname, element.tag))
             assert(itemname == item.name)
             if item.type != element.tag:
-                print_error(f"{xml_path}: A `{element.tag}` is defined with name `{itemname}`, "
+                print_error(f"A `{element.tag}` is defined with name `{itemname}`, "
                             f"but there's already an item called like that with type `{item.type}`. "
-                            "Entry ignored.")
+                            "Entry ignored.", xml_path)
                 continue
+            if item.is_shared:
+                item = item.copy()
+                view[itemname] = item
 
             item.params = {**item.params, **found_params}
             item.is_extra = really_extra
@@ -143,14 +165,122 @@ def read_view(xml_path, variables, viewname, viewnode, view) -> Set[str]:
     return unsupported_elems
 
 
-def load_es_xml(xml_path: str) -> ET.Element:
-    # ES supports illegal XMLs...
+XML_CHUNK_SIZE = 64 * 1024
+
+# ES accepts comments with an extra dash, which are invalid in XML
+ES_COMMENT_FIXUPS = (('<!---', '<!-- '), ('--->', ' -->'))
+ES_COMMENT_MARKERS = tuple(marker for marker, _ in ES_COMMENT_FIXUPS)
+
+# The top level nodes used by read_theme_xml, everything else is dropped while parsing
+THEME_XML_NODES = frozenset(['formatVersion', 'variables', 'include', 'feature', 'view'])
+
+
+def marker_prefix_len(text: str) -> int:
+    # Length of the text at the end that may be the start of a marker
+    for length in range(min(len(text), 4), 0, -1):
+        if any(marker.startswith(text[-length:]) for marker in ES_COMMENT_MARKERS):
+            return length
+    return 0
+
+
+def iter_es_xml_chunks(file) -> Iterator[str]:
+    pending = ''
+    while True:
+        chunk = file.read(XML_CHUNK_SIZE)
+        if not chunk:
+            break
+
+        text = pending + chunk
+        for marker, replacement in ES_COMMENT_FIXUPS:
+            text = text.replace(marker, replacement)
+        # A marker might continue in the next chunk
+        keep_len = marker_prefix_len(text)
+        pending = text[len(text) - keep_len:]
+        yield text[:len(text) - keep_len]
+
+    if pending:
+        yield pending
+
+
+def parse_es_xml(file) -> Optional[ET.Element]:
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root: Optional[ET.Element] = None
+    depth = 0
+    for chunk in iter_es_xml_chunks(file):
+        parser.feed(chunk)
+        for event, node in parser.read_events():
+            if event == 'end':
+                depth -= 1
+                if depth == 1 and node.tag not in THEME_XML_NODES:
+                    root.remove(node)
+                continue
+
+            depth += 1
+            if depth == 1:
+                root = node
+                if root.tag != 'theme':
+                    return root
+
+    parser.close()
+    return root
+
+
+def hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def hash_file_version(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    return hash_file(path)
+
+
+def hash_asset(path: str) -> Optional[str]:
+    # The assets are often shared by the platforms, so they are only
+    # read again when they change
     try:
-        with open(xml_path, 'r') as file:
-            contents = file.read() \
-                .replace('<!---', '<!-- ') \
-                .replace('--->', ' -->')
-            root = ET.fromstring(contents)
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return hash_file_version(path, stat.st_mtime_ns, stat.st_size)
+
+
+class HashingFile(io.RawIOBase):
+    # Hashes a file while it is streamed to the parser
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.digest = hashlib.sha1()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.file.readinto(buffer)
+        if count:
+            self.digest.update(memoryview(buffer)[:count])
+        return count
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+@traced
+def load_es_xml(xml_path: str, data: Optional[bytes] = None) -> Tuple[ET.Element, str]:
+    # ES supports illegal XMLs... The hash of the contents the element
+    # was parsed from is returned with it.
+    try:
+        if data is not None:
+            digest = hashlib.sha1(data)
+            raw = io.BytesIO(data)
+        else:
+            raw = HashingFile(xml_path)
+            digest = raw.digest
+        with io.TextIOWrapper(io.BufferedReader(raw)) as file:
+            root = parse_es_xml(file)
     except ET.ParseError as err:
         raise RuntimeError(f"{xml_path}: The file does not follow the rules of the XML format: {err}")
     except FileNotFoundError:
@@ -158,54 +288,184 @@ def load_es_xml(xml_path: str) -> ET.Element:
     except UnicodeDecodeError as err:
         raise RuntimeError(f"{xml_path}: Invalid unicode data: {err}")
 
-    if root.tag != 'theme':
+    if root is None or root.tag != 'theme':
         raise RuntimeError(f"{xml_path}: A theme XML must start with a `<theme>` element")
 
-    return root
+    return root, digest.hexdigest()
+
+
+class ParsedXml():
+    def __init__(self, root: ET.Element, digest: str):
+        self.root = root
+        self.digest = digest
+        self.variables = root.findall('variables')
+        self.includes = root.findall('include')
+        self.views = [viewnode
+                      for feature_group in [root] + root.findall('feature')
+                      for viewnode in feature_group.findall('view')]
+
 
+# Larger files are streamed from the disk by the parser instead
+MAX_PREFETCH_SIZE = 4 * 1024 * 1024
 
-def read_theme_xml(root_dir, xml_path, variables, views, check_version=True) -> Set[str]:
+
+def read_file_data(path: str) -> Optional[Tuple[int, int, bytes]]:
+    try:
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size > MAX_PREFETCH_SIZE:
+                return None
+            return stat.st_mtime_ns, stat.st_size, file.read()
+    except OSError:
+        # Reported when the file is actually loaded
+        return None
+
+
+class XmlPrefetcher():
+    def __init__(self, max_workers: int):
+        self.pool = ThreadPoolExecutor(max_workers)
+        self.pending: Dict[str, Future] = {}
+
+    def prefetch(self, xml_path: str):
+        norm_path = os.path.normpath(xml_path)
+        if norm_path not in self.pending:
+            self.pending[norm_path] = self.pool.submit(read_file_data, xml_path)
+
+    def take(self, xml_path: str) -> Optional[Tuple[int, int, bytes]]:
+        future = self.pending.pop(os.path.normpath(xml_path), None)
+        return future.result() if future else None
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_prefetcher(io_jobs: int):
+    # Yields None when the files are only read when needed
+    return XmlPrefetcher(io_jobs) if io_jobs > 1 else nullcontext()
+
+
+# The number of parsed files kept by a cache. Only the includes shared by
+# several platforms are worth keeping.
+XML_CACHE_SIZE = 256
+LOW_MEMORY_XML_CACHE_SIZE = 16
+
+
+class XmlCache():
+    def __init__(self, prefetcher: Optional[XmlPrefetcher] = None, max_entries: int = XML_CACHE_SIZE):
+        # Least recently used first
+        self.entries: Dict[str, Tuple[int, int, ParsedXml]] = {}
+        self.loaded_paths: Set[str] = set()
+        self.prefetcher = prefetcher
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, xml_path: str):
+        if self.prefetcher and os.path.normpath(xml_path) not in self.loaded_paths:
+            self.prefetcher.prefetch(xml_path)
+
+    def load(self, xml_path: str) -> ParsedXml:
+        norm_path = os.path.normpath(xml_path)
+        prefetched = self.prefetcher.take(xml_path) if self.prefetcher else None
+        if prefetched:
+            mtime_ns, size, data = prefetched
+        else:
+            try:
+                stat = os.stat(xml_path)
+            except FileNotFoundError:
+                raise RuntimeError(f"{xml_path}: File not found")
+            mtime_ns, size, data = stat.st_mtime_ns, stat.st_size, None
+
+        entry = self.entries.pop(norm_path, None)
+        if entry and entry[:2] == (mtime_ns, size):
+            self.hits += 1
+            self.entries[norm_path] = entry
+            return entry[2]
+
+        # NOTE: failures are not cached, so every platform reports them
+        # with its own include path
+        self.misses += 1
+        parsed = ParsedXml(*load_es_xml(xml_path, data))
+        self.entries[norm_path] = (mtime_ns, size, parsed)
+        self.loaded_paths.add(norm_path)
+        self.trim()
+        return parsed
+
+    def forget(self, xml_path: str):
+        norm_path = os.path.normpath(xml_path)
+        self.entries.pop(norm_path, None)
+        self.loaded_paths.discard(norm_path)
+
+    def trim(self):
+        while len(self.entries) > self.max_entries:
+            self.forget(next(iter(self.entries)))
+
+
+def read_theme_xml(root_dir, xml_path, variables, views, cache: XmlCache, deps: Dict[str, Optional[str]],
+                   include_chain: Tuple[str, ...] = (), check_version=True) -> Set[str]:
     # print_info(f'  - reading `{xml_path}`...')
 
-    root = load_es_xml(xml_path)
+    norm_path = os.path.normpath(xml_path)
+    if norm_path in include_chain:
+        cycle = include_chain[include_chain.index(norm_path):] + (norm_path,)
+        raise RuntimeError(f"{xml_path}: Include cycle detected: {' -> '.join(cycle)}")
+    include_chain += (norm_path,)
+
+    parsed = cache.load(xml_path)
+    deps[norm_path] = parsed.digest
 
     if check_version:
-        check_format_version(xml_path, root)
+        check_format_version(xml_path, parsed.root)
 
-    for node in root.findall('variables'):
+    # Like in ES, the first definition of a variable is kept: a file's own
+    # variables are read before its includes, so an include can't override
+    # the variables of the files that include it
+    for node in parsed.variables:
         for child in node:
             text = child.text.strip() if child.text else None
             if text:
-                variables[child.tag] = text
+                variables.setdefault(child.tag, text)
 
     all_unsupported_elems = set()
 
-    for node in root.findall('include'):
+    # Start reading every include before processing the first one
+    for node in parsed.includes:
+        if node.text and node.text.strip():
+            cache.prefetch(os.path.join(os.path.dirname(xml_path), node.text.strip()))
+
+    for node in parsed.includes:
         text = node.text.strip() if node.text else None
         if not text:
-            warn(f"{xml_path}: Found an empty include")
+            warn("Found an empty include", xml_path)
             continue
 
         path = os.path.join(os.path.dirname(xml_path), text)
-        unsupported_elems = read_theme_xml(root_dir, path, variables, views, check_version=False)
+        with span('include', path=path):
+            unsupported_elems = read_theme_xml(root_dir, path, variables, views, cache, deps,
+                                               include_chain, check_version=False)
         all_unsupported_elems.update(unsupported_elems)
 
-    feature_groups = [root] + root.findall('feature')
-    for feature_group in feature_groups:
-        for viewnode in feature_group.findall('view'):
-            name_str = viewnode.attrib['name'] if viewnode.attrib and 'name' in viewnode.attrib else None
-            if not name_str:
-                continue
+    for viewnode in parsed.views:
+        name_str = viewnode.attrib['name'] if viewnode.attrib and 'name' in viewnode.attrib else None
+        if not name_str:
+            continue
 
-            affected_views = [s.strip() for s in re.split(r'[,\s]+', name_str)]
-            affected_views = list(filter(None, affected_views))
-            for viewname in affected_views:
-                # TODO: Add support
-                if viewname not in RESERVED_ITEMS:
-                    continue
-                views.setdefault(viewname, {})
-                unsupported_elems = read_view(xml_path, variables, viewname, viewnode, views[viewname])
-                all_unsupported_elems.update(unsupported_elems)
+        affected_views = [s.strip() for s in re.split(r'[,\s]+', name_str)]
+        affected_views = list(filter(None, affected_views))
+        for viewname in affected_views:
+            # TODO: Add support
+            if viewname not in RESERVED_ITEMS:
+                continue
+            views.setdefault(viewname, {})
+            unsupported_elems = read_view(xml_path, variables, viewname, viewnode, views[viewname])
+            all_unsupported_elems.update(unsupported_elems)
 
     # print_info(f'  - returning from `{xml_path}`...')
     return all_unsupported_elems
@@ -228,29 +488,143 @@ def find_theme_xmls(root_dir: str) -> Dict[str, str]:
     return theme_xmls
 
 
-def find_platforms(root_dir: str) -> List[Platform]:
-    platforms: List[Platform] = []
-    all_unsupported_elems: Set[str] = set()
+def collect_asset_paths(views: Dict[str, Dict[str, Element]]) -> Set[str]:
+    paths: Set[str] = set()
+    for view in views.values():
+        for elem in view.values():
+            for propname, prop in elem.params.items():
+                if KNOWN_ELEMENTS[elem.type].get(propname) == PropType.PATH:
+                    paths.add(prop)
+    return paths
+
 
-    theme_xmls = find_theme_xmls(root_dir)
-    for platform_name, xml_path in theme_xmls.items():
-        print_info(f"Processing platform `{platform_name}` (`{xml_path}`)")
+def read_platform(root_dir: str, platform_name: str, xml_path: str, cache: XmlCache) -> Optional[Platform]:
+    print_info(f"Processing platform `{platform_name}` (`{xml_path}`)")
 
-        try:
+    try:
+        with span('read_platform', platform=platform_name), record_diagnostics() as diagnostics:
             variables: Dict[str, str] = {}
             views: Dict[str, Dict[str, Element]] = create_default_views(root_dir)
-            unsupported_elems = read_theme_xml(root_dir, xml_path, variables, views)
-        except RuntimeError as err:
-            print_error(err)
-            warn(f"Platform `{platform_name}` skipped")
-            continue
-
-        platforms.append(Platform(platform_name, views))
-        all_unsupported_elems.update(unsupported_elems)
+            deps: Dict[str, Optional[str]] = {}
+            unsupported_elems = read_theme_xml(root_dir, xml_path, variables, views, cache, deps)
+    except RuntimeError as err:
+        print_error(err)
+        warn(f"Platform `{platform_name}` skipped")
+        return None
+    finally:
+        # Only the includes are shared with the other platforms
+        cache.forget(xml_path)
+
+    for path in collect_asset_paths(views):
+        deps[path] = hash_asset(path)
+    return Platform(platform_name, views, deps, unsupported_elems, diagnostics)
+
+
+MAX_PENDING_PLATFORMS = 32
+
+# Every worker process keeps its own cache between the platforms it receives
+WORKER_XML_CACHE = XmlCache()
+
+
+def read_platform_captured(task):
+    # Reads and processes a platform in a worker process. Only the result of
+    # the processing is sent back, so the platform itself never has to be.
+    root_dir, platform_name, xml_path, process, can_color, io_jobs, cache_size = task
+
+    start_worker_task()
+    WORKER_XML_CACHE.max_entries = cache_size
+    WORKER_XML_CACHE.trim()
+    hits, misses = WORKER_XML_CACHE.hits, WORKER_XML_CACHE.misses
+    parse_hits, parse_misses = parse_cache_stats()
+    out = CapturedOutput(can_color)
+    err = CapturedOutput(can_color)
+    buffer_diagnostics(True)
+    try:
+        # The prefetcher's threads don't outlive the task
+        with open_prefetcher(io_jobs) as prefetcher, redirect_stdout(out), redirect_stderr(err):
+            WORKER_XML_CACHE.prefetcher = prefetcher
+            platform = read_platform(root_dir, platform_name, xml_path, WORKER_XML_CACHE)
+            result = process(platform) if platform and process else platform
+            unsupported_elems = platform.unsupported_elems if platform else set()
+    finally:
+        WORKER_XML_CACHE.prefetcher = None
+        buffer_diagnostics(False)
+
+    new_parse_hits, new_parse_misses = parse_cache_stats()
+    cache_stats = (WORKER_XML_CACHE.hits - hits, WORKER_XML_CACHE.misses - misses,
+                   new_parse_hits - parse_hits, new_parse_misses - parse_misses)
+    return (result, unsupported_elems, out.getvalue(), err.getvalue(), take_diagnostics(),
+            cache_stats, take_events(), take_worker_peak())
+
+
+def bounded_map(executor, func, items, max_pending: int):
+    # Like executor.map, but only keeps a limited number of results waiting
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_platforms(root_dir: str, executor=None, skipped_platforms=frozenset(),
+                   io_jobs: int = 1, process=None, skipped_unsupported_elems=frozenset(),
+                   cache_size: int = XML_CACHE_SIZE) -> Iterator:
+    # Yields the platforms, or the results of `process` called with each of
+    # them. With an executor, `process` must be picklable, and runs in the
+    # same worker that read the platform. The unsupported elements of the
+    # skipped platforms are reported with the others.
+    all_unsupported_elems: Set[str] = set(skipped_unsupported_elems)
+    xml_cache = XmlCache(max_entries=cache_size)
+    # The property cache counts of every platform, wherever it was read
+    parse_hits, parse_misses = 0, 0
+
+    theme_xmls = sorted(find_theme_xmls(root_dir).items())
+    theme_xmls = [(name, path) for name, path in theme_xmls if name not in skipped_platforms]
+    if executor:
+        can_color = term_can_color()
+        tasks = [(root_dir, name, path, process, can_color, io_jobs, cache_size) for name, path in theme_xmls]
+        results = bounded_map(executor, read_platform_captured, tasks, MAX_PENDING_PLATFORMS)
+        for result, unsupported_elems, out, err, diagnostics, cache_stats, events, memory_peak in results:
+            add_events(events)
+            add_worker_peak(memory_peak)
+            sys.stdout.write(out)
+            sys.stderr.write(err)
+            add_diagnostics(diagnostics)
+            xml_cache.hits += cache_stats[0]
+            xml_cache.misses += cache_stats[1]
+            parse_hits += cache_stats[2]
+            parse_misses += cache_stats[3]
+            if result:
+                all_unsupported_elems.update(unsupported_elems)
+                yield result
+    else:
+        with open_prefetcher(io_jobs) as prefetcher:
+            xml_cache.prefetcher = prefetcher
+            for index, (platform_name, xml_path) in enumerate(theme_xmls):
+                # Keep reading the files of the next few platforms in the background
+                for _, next_path in theme_xmls[index:index + io_jobs]:
+                    xml_cache.prefetch(next_path)
+
+                start_hits, start_misses = parse_cache_stats()
+                platform = read_platform(root_dir, platform_name, xml_path, xml_cache)
+                end_hits, end_misses = parse_cache_stats()
+                parse_hits += end_hits - start_hits
+                parse_misses += end_misses - start_misses
+                if platform:
+                    all_unsupported_elems.update(platform.unsupported_elems)
+                    yield process(platform) if process else platform
+
+    add_cache_stats('XML cache', xml_cache.hits, xml_cache.misses)
+    add_cache_stats('Property cache', parse_hits, parse_misses)
 
     if all_unsupported_elems:
         warn("The following unknown or unsupported items were found in this theme:")
-        for elem in all_unsupported_elems:
+        for elem in sorted(all_unsupported_elems):
             warn(f"  - {elem}")
 
-    return platforms
+
+def find_platforms(root_dir: str, executor=None, skipped_platforms=frozenset(),
+                   io_jobs: int = 1) -> List[Platform]:
+    return list(iter_platforms(root_dir, executor, skipped_platforms, io_jobs))
@@ -0,0 +1,179 @@
+import math
+import os
+import re
+import struct
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Tuple
+
+
+IMAGE_EXTENSIONS = frozenset(['.png', '.jpg', '.jpeg', '.gif', '.svg'])
+
+# The screen size the source sizes are calculated for, None disables them
+TARGET_RESOLUTION: Optional[Tuple[int, int]] = None
+# Every image file of the theme, found with a single directory walk
+ASSET_INDEX: FrozenSet[str] = frozenset()
+
+
+def build_asset_index(root_dir: str) -> FrozenSet[str]:
+    paths = []
+    for dirpath, _, filenames in os.walk(root_dir):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.normpath(os.path.join(dirpath, filename)))
+    return frozenset(paths)
+
+
+def set_asset_index(asset_index: FrozenSet[str]):
+    global ASSET_INDEX
+    ASSET_INDEX = asset_index
+    read_image_size.cache_clear()
+
+
+def set_image_resolution(resolution: Optional[Tuple[int, int]]):
+    global TARGET_RESOLUTION
+    TARGET_RESOLUTION = resolution
+
+
+def parse_resolution(text: str) -> Optional[Tuple[int, int]]:
+    if text.lower() == 'none':
+        return None
+    res = re.match(r'^(\d+)x(\d+)$', text)
+    if not res or not int(res.group(1)) or not int(res.group(2)):
+        raise ValueError(f"Invalid resolution `{text}`, expected a value like `1280x720`")
+    return int(res.group(1)), int(res.group(2))
+
+
+def read_png_size(header: bytes) -> Optional[Tuple[int, int]]:
+    if header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def read_gif_size(header: bytes) -> Optional[Tuple[int, int]]:
+    return struct.unpack('<HH', header[6:10])
+
+
+def read_jpeg_size(file) -> Optional[Tuple[int, int]]:
+    file.seek(2)
+    while True:
+        marker = file.read(2)
+        if len(marker) != 2 or marker[0] != 0xFF:
+            return None
+        # Padding bytes
+        while marker[1:] == b'\xFF':
+            marker = marker[1:] + file.read(1)
+        if len(marker) != 2:
+            return None
+        kind = marker[1]
+        if kind == 0x01 or 0xD0 <= kind <= 0xD9:
+            continue
+
+        length_data = file.read(2)
+        if len(length_data) != 2:
+            return None
+        length = struct.unpack('>H', length_data)[0]
+        # Start of frame, except for DHT, JPG and DAC
+        if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+            frame = file.read(5)
+            if len(frame) != 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+SVG_TAG_PATTERN = re.compile(r'<svg\b[^>]*>', re.DOTALL)
+SVG_LENGTH_PATTERN = re.compile(r'^\s*([0-9.]+)\s*(px)?\s*$')
+
+
+def read_svg_attrib(tag: str, name: str) -> Optional[str]:
+    res = re.search(r'\s' + name + r'\s*=\s*["\']([^"\']*)["\']', tag)
+    return res.group(1) if res else None
+
+
+def read_svg_size(header: bytes) -> Optional[Tuple[int, int]]:
+    res = SVG_TAG_PATTERN.search(header.decode('utf-8', errors='replace'))
+    if not res:
+        return None
+    tag = res.group(0)
+
+    width = SVG_LENGTH_PATTERN.match(read_svg_attrib(tag, 'width') or '')
+    height = SVG_LENGTH_PATTERN.match(read_svg_attrib(tag, 'height') or '')
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+
+    viewbox = (read_svg_attrib(tag, 'viewBox') or '').replace(',', ' ').split()
+    if len(viewbox) == 4:
+        try:
+            return round(float(viewbox[2])), round(float(viewbox[3]))
+        except ValueError:
+            pass
+    return None
+
+
+SVG_HEADER_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def read_image_size(path: str) -> Optional[Tuple[int, int]]:
+    # Only the headers are read, the images are never decoded
+    if path not in ASSET_INDEX:
+        return None
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(SVG_HEADER_SIZE)
+            if header.startswith(b'\x89PNG\r\n\x1a\n'):
+                size = read_png_size(header)
+            elif header.startswith((b'GIF87a', b'GIF89a')):
+                size = read_gif_size(header)
+            elif header.startswith(b'\xFF\xD8'):
+                size = read_jpeg_size(file)
+            elif b'<svg' in header:
+                size = read_svg_size(header)
+            else:
+                size = None
+    except (OSError, struct.error):
+        return None
+
+    if not size or not size[0] or not size[1]:
+        return None
+    return size
+
+
+def calc_source_size(path: str, width: float, height: float, crop: bool) -> Optional[Tuple[int, int]]:
+    # The size an image drawn at the normalized size should be decoded at,
+    # or None if it's already small enough. With `crop`, the image has to
+    # cover both sides (eg. when stretched), otherwise it only has to fit
+    # in them. A zero side follows the image's aspect ratio.
+    if not TARGET_RESOLUTION or (not width and not height):
+        return None
+    image_size = read_image_size(path)
+    if not image_size:
+        return None
+
+    scales = []
+    if width:
+        scales.append(width * TARGET_RESOLUTION[0] / image_size[0])
+    if height:
+        scales.append(height * TARGET_RESOLUTION[1] / image_size[1])
+    scale = max(scales) if crop else min(scales)
+    if scale >= 1.0:
+        return None
+    return math.ceil(image_size[0] * scale), math.ceil(image_size[1] * scale)
+
+
+def render_prop_source_size(props: Dict[str, str], path: str, width: float, height: float, crop: bool):
+    size = calc_source_size(path, width, height, crop)
+    if size:
+        props['sourceSize.width'] = str(size[0])
+        props['sourceSize.height'] = str(size[1])
+
+
+def render_prop_source_box(props: Dict[str, str], width: float, height: float):
+    # For images only known at runtime; raster images are never scaled up
+    # to a sourceSize, only down to fit in it
+    if not TARGET_RESOLUTION or not width or not height:
+        return
+
+    props['sourceSize.width'] = str(math.ceil(width * TARGET_RESOLUTION[0]))
+    props['sourceSize.height'] = str(math.ceil(height * TARGET_RESOLUTION[1]))
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List
+
+from errors import warn
+from es_reader import hash_file
+from qml import PlatformOutput
+from qml_render import ViewText
+
+
+MANIFEST_FILENAME = '.converter-manifest.json'
+MANIFEST_VERSION = 2
+
+
+@lru_cache(maxsize=1)
+def converter_version() -> str:
+    # Any change to the converter may change the generated files
+    digest = hashlib.sha1()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(src_dir)):
+        if filename.endswith('.py'):
+            with open(os.path.join(src_dir, filename), 'rb') as file:
+                digest.update(filename.encode('utf-8'))
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def output_to_json(output: PlatformOutput) -> dict:
+    return {
+        'views': {viewname: [view.imports, view.root_line, view.body] for viewname, view in output.views.items()},
+        'fonts': output.fonts,
+        'logo': output.logo,
+        'system_snippets': list(output.system_snippets) if output.system_snippets else None,
+        'unsupported_elems': output.unsupported_elems,
+        'diagnostics': [list(record) for record in output.diagnostics],
+    }
+
+
+def output_from_json(name: str, data: dict) -> PlatformOutput:
+    system_snippets = tuple(data['system_snippets']) if data['system_snippets'] else None
+    views = {viewname: ViewText(*view) for viewname, view in data['views'].items()}
+    output = PlatformOutput(name, views, data['fonts'], data['logo'], system_snippets, data['unsupported_elems'])
+    output.diagnostics = [tuple(record) for record in data['diagnostics']]
+    return output
+
+
+def load_manifest(out_dir: str) -> dict:
+    manifest_path = os.path.join(out_dir, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as err:
+        warn(f"Could not read the manifest, doing a full rebuild: {err}", manifest_path)
+        return {}
+
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data
+
+
+def get_platform_entries(manifest: dict, input_dir: str, options: dict) -> Dict[str, dict]:
+    if manifest.get('converter') != converter_version():
+        return {}
+    if manifest.get('input_dir') != os.path.abspath(input_dir):
+        return {}
+    # Different options may change every generated file
+    if manifest.get('options') != options:
+        return {}
+
+    return manifest.get('platforms', {})
+
+
+def get_generated_files(manifest: dict) -> List[str]:
+    # The files written by the previous run, relative to the output directory
+    return manifest.get('files', [])
+
+
+def find_up_to_date_platforms(entries: Dict[str, dict], theme_xmls: Dict[str, str]) -> Dict[str, PlatformOutput]:
+    outputs: Dict[str, PlatformOutput] = {}
+    for platform_name, xml_path in theme_xmls.items():
+        entry = entries.get(platform_name)
+        if not entry or entry['xml_path'] != xml_path:
+            continue
+        if all(hash_file(path) == digest for path, digest in entry['deps'].items()):
+            outputs[platform_name] = output_from_json(platform_name, entry['output'])
+
+    return outputs
+
+
+def write_manifest(out_dir: str, data: dict):
+    with open(os.path.join(out_dir, MANIFEST_FILENAME), 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+
+
+def invalidate_manifest(out_dir: str, manifest: dict):
+    # Called before the output is changed, so an interrupted run doesn't
+    # leave platforms marked as up to date. The generated files are kept
+    # to be able to remove them later.
+    if manifest:
+        write_manifest(out_dir, {'version': MANIFEST_VERSION, 'files': get_generated_files(manifest)})
+
+
+def save_manifest(out_dir: str, input_dir: str, options: dict, theme_xmls: Dict[str, str],
+                  outputs: List[PlatformOutput], old_entries: Dict[str, dict], generated_files):
+    entries: Dict[str, dict] = {}
+    for output in outputs:
+        if output.deps is not None:
+            deps = dict(sorted(output.deps.items()))
+        else:
+            deps = old_entries[output.name]['deps']
+
+        entries[output.name] = {
+            'xml_path': theme_xmls[output.name],
+            'deps': deps,
+            'output': output_to_json(output),
+        }
+
+    data = {
+        'version': MANIFEST_VERSION,
+        'converter': converter_version(),
+        'input_dir': os.path.abspath(input_dir),
+        'options': options,
+        'platforms': entries,
+        'files': sorted(generated_files),
+    }
+    write_manifest(out_dir, data)
@@ -0,0 +1,145 @@
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from errors import print_info
+
+
+# (stage name, retained bytes, peak bytes, largest allocation sites after the stage)
+MEMORY_STAGES: List[Tuple[str, int, int, List[Tuple[int, str, int]]]] = []
+MEMORY_REPORT_ENABLED = False
+# Cache name -> [hits, misses]
+CACHE_STATS: Dict[str, List[int]] = {}
+# Only the largest allocation sites are kept, not the snapshots
+TOP_ALLOCATION_SITES = 10
+# The largest peak of the worker processes, None if there were none
+WORKER_PEAK: Optional[int] = None
+
+
+def enable_memory_report(enabled: bool = True):
+    global MEMORY_REPORT_ENABLED
+    MEMORY_REPORT_ENABLED = enabled
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def memory_stage(name: str):
+    if not MEMORY_REPORT_ENABLED:
+        yield
+        return
+
+    start_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        end_size, peak_size = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        top_sites = [(stat.size, stat.traceback[0].filename, stat.traceback[0].lineno)
+                     for stat in snapshot.statistics('lineno')[:TOP_ALLOCATION_SITES]]
+        del snapshot
+        MEMORY_STAGES.append((name, end_size - start_size, peak_size, top_sites))
+
+
+def start_worker_task():
+    # Called in a worker process before every task, the peak is sent back
+    # with the results of the task
+    if MEMORY_REPORT_ENABLED:
+        tracemalloc.reset_peak()
+
+
+def take_worker_peak() -> Optional[int]:
+    if not MEMORY_REPORT_ENABLED:
+        return None
+    _, peak_size = tracemalloc.get_traced_memory()
+    return peak_size
+
+
+def add_worker_peak(peak_size: Optional[int]):
+    global WORKER_PEAK
+    if peak_size is not None:
+        WORKER_PEAK = max(peak_size, WORKER_PEAK or 0)
+
+
+def add_cache_stats(name: str, hits: int, misses: int):
+    stats = CACHE_STATS.setdefault(name, [0, 0])
+    stats[0] += hits
+    stats[1] += misses
+
+
+def deep_sizeof(obj, seen: set) -> int:
+    size = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending.extend(item)
+        if hasattr(item, '__dict__'):
+            pending.append(item.__dict__)
+        for slot in getattr(type(item), '__slots__', ()):
+            if hasattr(item, slot):
+                pending.append(getattr(item, slot))
+
+    return size
+
+
+def format_size(size: int) -> str:
+    return f"{size / 1024:,.1f} KiB"
+
+
+def print_memory_report(outputs, shared_objects, top_count: int = 10):
+    if not MEMORY_REPORT_ENABLED:
+        return
+
+    print_info("Memory usage by stage, with the largest allocation sites after it:")
+    if WORKER_PEAK is not None:
+        print_info("  (of the main process only: the platforms were read and rendered by the worker processes, "
+                   "whose results are allocated where they are received)")
+    for name, retained, peak, top_sites in MEMORY_STAGES:
+        print_info(f"  - {name}: {format_size(retained)} retained, {format_size(peak)} peak")
+        for size, filename, lineno in top_sites[:top_count]:
+            print_info(f"      {format_size(size):>12}  {filename}:{lineno}")
+
+    # objects shared between platforms, like the default views, are not counted
+    seen = set()
+    deep_sizeof(shared_objects, seen)
+
+    platform_sizes = {}
+    for output in outputs:
+        platform_sizes[output.name] = platform_sizes.get(output.name, 0) + deep_sizeof(output, seen)
+
+    print_info("Largest platforms by retained size:")
+    for name, size in sorted(platform_sizes.items(), key=lambda item: -item[1])[:top_count]:
+        print_info(f"  - {name}: {format_size(size)}")
+
+    # The peak is reset when every stage starts
+    _, peak_size = tracemalloc.get_traced_memory()
+    peak_size = max([peak_size] + [peak for _, _, peak, _ in MEMORY_STAGES])
+    print_info(f"Peak traced memory: {format_size(peak_size)}")
+    if WORKER_PEAK is not None:
+        print_info(f"Peak traced memory of a worker process: {format_size(WORKER_PEAK)}")
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        if sys.platform != 'darwin':
+            max_rss *= 1024
+        print_info(f"Peak RSS: {format_size(max_rss)}")
+    except ImportError:
+        pass
+
+    # Every worker process has its own caches, so these depend on --jobs
+    for name, (hits, misses) in sorted(CACHE_STATS.items()):
+        print_info(f"{name}: {hits} hits, {misses} misses")
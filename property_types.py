@@ -1,18 +1,58 @@
 import os
 import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
 from errors import print_error
 from static import PropType
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 
 
-class NormPair():
-    def __init__(self, prop_str):
+class PropertyValue(ABC):
+    # Immutable, hashable values; the ones created by parse_value are
+    # shared while they're in its cache
+    __slots__ = ('source',)
+    FIELDS: Tuple[str, ...] = ()
+
+    def __new__(cls, prop_str):
+        value = object.__new__(cls)
+        object.__setattr__(value, 'source', prop_str)
+        for field, field_val in zip(cls.FIELDS, cls.parse(prop_str)):
+            object.__setattr__(value, field, field_val)
+        return value
+
+    @staticmethod
+    @abstractmethod
+    def parse(prop_str) -> tuple:
+        pass
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash((type(self), self.values()))
+
+    def __reduce__(self):
+        return (self.__class__, (self.source,))
+
+
+class NormPair(PropertyValue):
+    __slots__ = ('a', 'b')
+    FIELDS = __slots__
+
+    @staticmethod
+    def parse(prop_str) -> tuple:
         fields = prop_str.split(maxsplit=1)
         if len(fields) != 2:
             raise ValueError(f"Invalid normalized pair: `{prop_str}`")
 
         try:
-            self.a, self.b = map(float, fields)
+            return tuple(map(float, fields))
         except ValueError:
             raise ValueError(f"Invalid normalized pair values: `{prop_str}`")
 
@@ -20,37 +60,41 @@ class NormPair():
         return f"{self.__class__.__name__} {{ {self.a}, {self.b} }}"
 
 
-class NormRect():
-    def __init__(self, prop_str):
+class NormRect(PropertyValue):
+    __slots__ = ('a', 'b', 'c', 'd')
+    FIELDS = __slots__
+
+    @staticmethod
+    def parse(prop_str) -> tuple:
         fields = prop_str.split(maxsplit=3)
-        if len(fields) != 2 or len(fields) != 4:
+        if len(fields) not in (2, 4):
             raise ValueError(f"Invalid normalized rectangle: `{prop_str}`")
 
         try:
-            if len(fields) == 2:
-                self.a, self.b = map(float, fields)
-                self.c, self.d = self.a, self.b
-            else:
-                self.a, self.b, self.c, self.d = map(float, fields)
+            values = tuple(map(float, fields))
         except ValueError:
             raise ValueError(f"Invalid normalized rect values: `{prop_str}`")
+        return values * 2 if len(values) == 2 else values
 
     def __repr__(self):
         return f"{self.__class__.__name__} {{ {self.a}, {self.b}, {self.c}, {self.d} }}"
 
 
-class Color():
-    def __init__(self, prop_str):
-        res = re.match(r'^([0-9a-fA-F]{6})([0-9a-fA-F]{2})?$', prop_str)
+COLOR_PATTERN = re.compile(r'^([0-9a-fA-F]{6})([0-9a-fA-F]{2})?$')
+
+
+class Color(PropertyValue):
+    __slots__ = ('hex', 'color', 'opacity')
+    FIELDS = __slots__
+
+    @staticmethod
+    def parse(prop_str) -> tuple:
+        res = COLOR_PATTERN.match(prop_str)
         if not res:
             raise ValueError(f"Invalid color value: `{prop_str}`")
 
-        self.hex = prop_str
-        self.color = res.group(1)
-        if res.group(2):
-            self.opacity = int(res.group(2), 16) / 255
-        else:
-            self.opacity = 1.0
+        opacity = int(res.group(2), 16) / 255 if res.group(2) else 1.0
+        return (prop_str, res.group(1), opacity)
 
     def __repr__(self):
         return f"#{self.hex}"
@@ -59,24 +103,41 @@ class Color():
 Property = Union[NormPair, NormRect, Color, str, float, bool]
 
 
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_value(basedir: str, prop_type: PropType, prop_str: str) -> Property:
+    # Only the paths depend on the directory of the XML they're in,
+    # the basedir is empty for the other types
+    if prop_type == PropType.PATH:
+        return os.path.normpath(os.path.join(basedir, prop_str))
+    if prop_type == PropType.NORMALIZED_PAIR:
+        return NormPair(prop_str)
+    if prop_type == PropType.NORMALIZED_RECT:
+        return NormRect(prop_str)
+    if prop_type == PropType.COLOR:
+        return Color(prop_str)
+    if prop_type == PropType.FLOAT:
+        return float(prop_str)
+    if prop_type == PropType.BOOLEAN:
+        return prop_str.lower()[0] in ['1', 't', 'y']
+    raise ValueError(f"Unknown property type `{prop_type}`")
+
+
+def parse_cache_stats() -> Tuple[int, int]:
+    info = parse_value.cache_info()
+    return info.hits, info.misses
+
+
 def parse_param(basedir: str, prop_type: PropType, prop_str: str) -> Optional[Property]:
     assert(basedir)
     assert(prop_str)
+    if prop_type == PropType.STRING:
+        return prop_str
     try:
-        if prop_type == PropType.NORMALIZED_PAIR:
-            return NormPair(prop_str)
-        if prop_type == PropType.NORMALIZED_RECT:
-            return NormRect(prop_str)
-        if prop_type == PropType.STRING:
-            return prop_str
-        if prop_type == PropType.PATH:
-            return os.path.normpath(os.path.join(basedir, prop_str))
-        if prop_type == PropType.COLOR:
-            return Color(prop_str)
-        if prop_type == PropType.FLOAT:
-            return float(prop_str)
-        if prop_type == PropType.BOOLEAN:
-            return prop_str.lower()[0] in ['1', 't', 'y']
+        # Failures aren't cached, so every invalid value is reported
+        return parse_value(basedir if prop_type == PropType.PATH else '', prop_type, prop_str)
     except ValueError as err:
         print_error(err)
     return None
@@ -1,34 +1,119 @@
+import hashlib
 import os
-from typing import Dict, List
-
-from qml_render import render_view_items, font_path_to_name
+from typing import Dict, List, Optional, Set, Tuple
+
+from errors import print_info
+from qml_render import create_view_items, render_view, render_view_text, font_path_to_name, fold_layout_bindings, \
+    set_layout_target, ViewText
+from image_size import set_image_resolution
+from qml_optimize import optimize_view, set_optimize_views, take_binding_stats, add_binding_stats, \
+    take_removed_items, add_removed_items
 from qml_render_special import create_systemcarousel, create_systeminfo
 from static import SUPPORTED_VIEWS, STATIC_FILES
+from tracing import span, traced
 
 
+@traced
 def create_qml_defaults(default_views, out_files):
     for viewname in default_views:
         if viewname not in SUPPORTED_VIEWS:
             continue
 
-        lines = render_view_items(viewname, default_views[viewname].values())
-
-        import_lines = 5
-        lines.insert(import_lines, "  Rectangle { anchors.fill: parent; color: '#fff' }")
+        qroot = create_view_items(viewname, default_views[viewname].values())
+        optimize_view(viewname, qroot)
+        qroot.leading_lines.append("Rectangle { anchors.fill: parent; color: '#fff' }")
 
         filepath = os.path.join('__components', 'Missing' + viewname.title() + 'View.qml')
-        out_files[filepath] = '\n'.join(lines)
-
-
-def create_qml_platform_views(platform, out_files):
+        out_files[filepath] = render_view(qroot)
+
+
+class PlatformOutput():
+    def __init__(self, name, views, fonts, logo, system_snippets, unsupported_elems):
+        self.name = name
+        # View name -> QML contents
+        self.views: Dict[str, ViewText] = views
+        self.fonts: List[str] = fonts
+        self.logo: Optional[str] = logo
+        # The rendered carousel and system info, used if this is the first platform
+        self.system_snippets: Optional[Tuple[str, str]] = system_snippets
+        self.unsupported_elems: List[str] = unsupported_elems
+        # The messages reported while reading the platform, reported again
+        # when its cached output is used
+        self.diagnostics: List[Tuple[str, str, Optional[str]]] = []
+        # The files the platform was read from, not known for the outputs loaded from a manifest
+        self.deps: Optional[Dict[str, Optional[str]]] = None
+
+
+def create_qml_platform_views(platform) -> Dict[str, ViewText]:
+    views: Dict[str, ViewText] = {}
     for viewname in platform.views:
         if viewname not in SUPPORTED_VIEWS:
             continue
 
-        lines = render_view_items(viewname, platform.views[viewname].values())
+        qroot = create_view_items(viewname, platform.views[viewname].values())
+        optimize_view(viewname, qroot)
+        views[viewname] = render_view_text(qroot)
+
+    return views
+
+
+def render_system_snippets(system_view) -> Tuple[str, str]:
+    qcarousel = create_systemcarousel(system_view['systemcarousel'])
+    qgamecounter = create_systeminfo(system_view['systemInfo'])
+    fold_layout_bindings(qcarousel)
+    fold_layout_bindings(qgamecounter)
+    carousel_lines = qcarousel.render(indent=1)
+    gamecounter_lines = qgamecounter.render(indent=1)
+    return '\n'.join(carousel_lines), '\n'.join(gamecounter_lines)
+
+
+def create_platform_output(platform) -> PlatformOutput:
+    with span('create_platform_output', platform=platform.name):
+        output = PlatformOutput(
+            platform.name,
+            create_qml_platform_views(platform),
+            [font['path'] for font in collect_fonts([platform])],
+            collect_platform_logos([platform]).get(platform.name),
+            render_system_snippets(platform.views['system']),
+            sorted(platform.unsupported_elems))
+        output.deps = platform.deps
+        output.diagnostics = platform.diagnostics
+        return output
+
+
+# The layout target, the image resolution and whether the views are optimized
+RenderSettings = Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]], bool]
+
+
+def apply_render_settings(settings: RenderSettings):
+    layout_target, image_resolution, optimize = settings
+    set_layout_target(layout_target)
+    set_image_resolution(image_resolution)
+    set_optimize_views(optimize)
+
+
+RenderResults = Tuple[List[PlatformOutput], Dict[str, List[int]], Dict[str, Dict[str, int]]]
+
+
+def render_platform(variant_settings: List[RenderSettings], platform) -> RenderResults:
+    # Used by iter_platforms, possibly in a worker process, with
+    # functools.partial. Creates the output of every variant.
+    outputs = []
+    for settings in variant_settings:
+        apply_render_settings(settings)
+        outputs.append(create_platform_output(platform))
+    return outputs, take_binding_stats(), take_removed_items()
+
+
+def add_render_results(result: RenderResults) -> List[PlatformOutput]:
+    outputs, binding_stats, removed_items = result
+    add_binding_stats(binding_stats)
+    add_removed_items(removed_items)
+    return outputs
 
-        filepath = os.path.join(platform.name, viewname + '.qml')
-        out_files[filepath] = '\n'.join(lines)
+
+def create_platform_outputs(platforms) -> List[PlatformOutput]:
+    return [create_platform_output(platform) for platform in platforms]
 
 
 def collect_fonts(ui_platforms):
@@ -56,33 +141,143 @@ def collect_platform_logos(ui_platforms):
     return logos
 
 
-def collect_platform_views(ui_platforms) -> Dict[str, List[str]]:
-    views: Dict[str, List[str]] = {}
-    for platform in ui_platforms:
-        pname = platform.name
-        views[pname] = []
-        for viewname in platform.views:
-            views[pname].append(viewname)
-    return views
-
+class TemplateData():
+    # The per-platform information fill_templates needs, collected
+    # without keeping the platforms or their rendered views around
+    def __init__(self):
+        self.font_paths: Set[str] = set()
+        self.logos: Dict[str, str] = {}
+        # Platform name -> view name -> shared view file
+        self.view_files: Dict[str, Dict[str, str]] = {}
+        self.first_platform: Optional[str] = None
+        self.system_snippets: Optional[Tuple[str, str]] = None
+
+    def add_platform(self, output: PlatformOutput):
+        self.font_paths.update(output.fonts)
+        if output.logo:
+            self.logos[output.name] = output.logo
+        # The snippets come from the first platform that could be read
+        if output.system_snippets and (self.first_platform is None or output.name < self.first_platform):
+            self.first_platform = output.name
+            self.system_snippets = output.system_snippets
+
+
+def shared_view_path(contents: str) -> str:
+    # Identical views are written only once, at the same directory depth
+    # as the platform dirs, so their relative paths remain valid
+    digest = hashlib.sha1(contents.encode('utf-8')).hexdigest()[:16]
+    return f'__views/{digest}.qml'
+
+
+@traced
+def dedup_platform_views(outputs, out_files) -> Tuple[Dict[str, Dict[str, str]], Dict[str, ViewText]]:
+    view_files: Dict[str, Dict[str, str]] = {}
+    view_texts: Dict[str, ViewText] = {}
+    for output in outputs:
+        view_files[output.name] = {}
+        for viewname, view in output.views.items():
+            contents = view.text()
+            shared_path = shared_view_path(contents)
+            out_files[shared_path] = contents
+            view_texts[shared_path] = view
+            view_files[output.name][viewname] = shared_path
+
+    return view_files, view_texts
+
+
+def create_parametric_view(member_parts: List[List[str]]) -> Tuple[str, List[List[str]]]:
+    # The members have the same structure, only the literals at the odd indices differ
+    first_parts = member_parts[0]
+    varying = [idx for idx in range(1, len(first_parts), 2)
+               if any(parts[idx] != first_parts[idx] for parts in member_parts)]
+    param_idxs = {part_idx: param_idx for param_idx, part_idx in enumerate(varying)}
+
+    body = ''.join(f'root.viewParams[{param_idxs[idx]}]' if idx in param_idxs else part
+                   for idx, part in enumerate(first_parts))
+    rows = [[parts[idx] for idx in varying] for parts in member_parts]
+    return body, rows
+
+
+@traced
+def cluster_platform_views(view_files, view_texts: Dict[str, ViewText], out_files):
+    # Views that differ only in literal values are merged into one component,
+    # with the differences moved into a JS lookup table
+    shared_paths: Dict[str, str] = {}
+    for views in view_files.values():
+        for viewname, path in views.items():
+            shared_paths[path] = viewname
+
+    clusters: Dict[tuple, List[str]] = {}
+    for path, viewname in sorted(shared_paths.items()):
+        view = view_texts[path]
+        structure = tuple(view.parts()[0::2])
+        clusters.setdefault((viewname, tuple(view.imports), view.root_line, structure), []).append(path)
+
+    replaced_paths: Dict[str, str] = {}
+    for (_, imports, root_line, _), paths in clusters.items():
+        if len(paths) < 2:
+            continue
 
-def fill_templates(ui_platforms, default_views, out_files):
-    fonts = collect_fonts(ui_platforms)
-    platform_logos = collect_platform_logos(ui_platforms)
-    platform_views = collect_platform_views(ui_platforms)
+        body, rows = create_parametric_view([view_texts[path].parts() for path in paths])
+        digest = hashlib.sha1(ViewText(list(imports), root_line, body).text().encode('utf-8')).hexdigest()[:16]
+        view = ViewText(list(imports) + [f"import '{digest}.js' as ViewParams"], root_line,
+                        "\n  readonly property var viewParams: ViewParams.get(modelData.shortName)" + body)
+        component_path = f'__views/{digest}.qml'
+        out_files[component_path] = view.text()
+
+        row_idxs = {path: idx for idx, path in enumerate(paths)}
+        platform_rows = []
+        for platform_name, views in sorted(view_files.items()):
+            for path in views.values():
+                if path in row_idxs:
+                    platform_rows.append(f"    '{platform_name}': {row_idxs[path]},")
+
+        table_lines = [
+            ".pragma library",
+            "var values = [",
+        ] + [f"    [{', '.join(row)}]," for row in rows] + [
+            "];",
+            "var platforms = {",
+        ] + platform_rows + [
+            "};",
+            "function get(platform) {",
+            "    if (platform in platforms)",
+            "        return values[platforms[platform]];",
+            "    return values[platforms['__generic']];",
+            "}",
+        ]
+        out_files[f'__views/{digest}.js'] = '\n'.join(table_lines)
+
+        for path in paths:
+            del out_files[path]
+            replaced_paths[path] = component_path
+
+    for views in view_files.values():
+        for viewname, path in views.items():
+            views[viewname] = replaced_paths.get(path, path)
+
+    if replaced_paths:
+        component_count = len(set(replaced_paths.values()))
+        print_info(f"Merged {len(replaced_paths)} similar views into {component_count} parametric views")
+
+
+@traced
+def fill_templates(template_data: TemplateData, default_views, out_files):
+    fonts = [{'name': font_path_to_name(p), 'path': p} for p in template_data.font_paths]
+    view_files = template_data.view_files
 
     def sorted_str(lines: List[str]) -> str:
         lines.sort()
         return '\n'.join(lines).strip()
 
-    platform_logos_str = [f"    ['{platform}', '{path}']," for platform, path in platform_logos.items()]
+    platform_logos_str = [f"    ['{platform}', '{path}']," for platform, path in template_data.logos.items()]
     platform_logos_str = sorted_str(platform_logos_str)
 
-    platforms_w_system_str = [f"    '{k}'," for k, views in platform_views.items() if 'system' in views]
-    platforms_w_system_str = sorted_str(platforms_w_system_str)
+    system_files_str = [f"    ['{k}', '{views['system']}']," for k, views in view_files.items() if 'system' in views]
+    system_files_str = sorted_str(system_files_str)
 
-    platforms_w_details_str = [f"    '{k}'," for k, views in platform_views.items() if 'detailed' in views]
-    platforms_w_details_str = sorted_str(platforms_w_details_str)
+    details_files_str = [f"    ['{k}', '{views['detailed']}']," for k, views in view_files.items() if 'detailed' in views]
+    details_files_str = sorted_str(details_files_str)
 
     fontlist_str = [f"  FontLoader {{ id: {f['name']}; source: '{f['path']}' }}" for f in fonts]
     fontlist_str = sorted_str(fontlist_str)
@@ -91,38 +286,75 @@ def fill_templates(ui_platforms, default_views, out_files):
         .replace('$$FONTLIST$$', fontlist_str)
 
     out_files['__components/DetailsView.qml'] = out_files['__components/DetailsView.qml'] \
-        .replace('$$PLATFORMS_WITH_DETAILS$$', platforms_w_details_str)
+        .replace('$$DETAILS_VIEW_FILES$$', details_files_str)
 
     out_files['__components/SystemView.qml'] = out_files['__components/SystemView.qml'] \
         .replace('$$PLATFORM_LOGOS$$', platform_logos_str) \
-        .replace('$$PLATFORMS_WITH_SYSTEMS$$', platforms_w_system_str)
+        .replace('$$SYSTEM_VIEW_FILES$$', system_files_str)
 
-    first_system = default_views['system']
-    if ui_platforms:
-        first_system = sorted(ui_platforms, key=lambda p: p.name)[0].views['system']
+    if template_data.system_snippets:
+        carousel_str, gamecounter_str = template_data.system_snippets
+    else:
+        carousel_str, gamecounter_str = render_system_snippets(default_views['system'])
 
-    carousel_lines = create_systemcarousel(first_system['systemcarousel']).render(indent=1)
-    gamecounter_lines = create_systeminfo(first_system['systemInfo']).render(indent=1)
     out_files['__components/SystemView.qml'] = out_files['__components/SystemView.qml'] \
-        .replace('$$SYSTEMCAROUSEL$$', '\n'.join(carousel_lines)) \
-        .replace('$$SYSTEMINFO$$', '\n'.join(gamecounter_lines))
-
+        .replace('$$SYSTEMCAROUSEL$$', carousel_str) \
+        .replace('$$SYSTEMINFO$$', gamecounter_str)
 
-def create_qml(theme_name, platforms, default_views) -> Dict[str, str]:
-    out_files: Dict[str, str] = {}
-
-    create_qml_defaults(default_views, out_files)
-    for platform in platforms:
-        create_qml_platform_views(platform, out_files)
 
+def create_qml_static(theme_name, template_data: TemplateData, default_views, out_files):
     for path, contents in STATIC_FILES.items():
         out_files[path] = contents.strip()
 
-    fill_templates(platforms, default_views, out_files)
+    fill_templates(template_data, default_views, out_files)
 
     lines = [
         "name: " + theme_name,
     ]
     out_files['theme.cfg'] = '\n'.join(lines)
 
+
+def create_qml(theme_name, outputs, default_views) -> Dict[str, str]:
+    out_files: Dict[str, str] = {}
+
+    create_qml_defaults(default_views, out_files)
+
+    template_data = TemplateData()
+    for output in outputs:
+        template_data.add_platform(output)
+
+    template_data.view_files, view_texts = dedup_platform_views(outputs, out_files)
+    cluster_platform_views(template_data.view_files, view_texts, out_files)
+
+    create_qml_static(theme_name, template_data, default_views, out_files)
     return out_files
+
+
+class QmlStream():
+    # Every platform's views are written as soon as they arrive, and only
+    # the template data is kept. Similar views are not merged in this mode,
+    # as that would need all of them at the same time.
+    def __init__(self, theme_name, default_views, write_file):
+        self.theme_name = theme_name
+        self.default_views = default_views
+        self.write_file = write_file
+        self.template_data = TemplateData()
+        self.written_views: Set[str] = set()
+
+    def add_platform(self, output: PlatformOutput):
+        self.template_data.add_platform(output)
+        self.template_data.view_files[output.name] = {}
+        for viewname, view in output.views.items():
+            contents = view.text()
+            shared_path = shared_view_path(contents)
+            if shared_path not in self.written_views:
+                self.write_file(shared_path, contents)
+                self.written_views.add(shared_path)
+            self.template_data.view_files[output.name][viewname] = shared_path
+
+    def finish(self):
+        out_files: Dict[str, str] = {}
+        create_qml_defaults(self.default_views, out_files)
+        create_qml_static(self.theme_name, self.template_data, self.default_views, out_files)
+        for path, contents in out_files.items():
+            self.write_file(path, contents)
@@ -0,0 +1,430 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from errors import print_info
+from qml_render import QmlItem, get_layout_target
+
+
+# The QtQuick types the default values below are known for
+QUICK_ITEM_TYPES = frozenset(['Item', 'FocusScope', 'Rectangle', 'Image', 'Text', 'ListView', 'PathView', 'Flickable'])
+
+# Property values that only restate the QML defaults. Some defaults, like
+# the horizontal alignment of Text, depend on other things, so they're
+# not listed.
+ITEM_DEFAULTS: Dict[str, Set[str]] = {
+    'x': {'0'},
+    'y': {'0'},
+    'z': {'0'},
+    'rotation': {'0'},
+    'scale': {'1', '1.0'},
+    'opacity': {'1', '1.0'},
+    'visible': {'true'},
+    'enabled': {'true'},
+    'clip': {'false'},
+}
+TYPE_DEFAULTS: Dict[str, Dict[str, Set[str]]] = {
+    'Image': {
+        'fillMode': {'Image.Stretch'},
+        'asynchronous': {'false'},
+        'smooth': {'true'},
+    },
+    'Text': {
+        'textFormat': {'Text.AutoText'},
+        'wrapMode': {'Text.NoWrap'},
+        'elide': {'Text.ElideNone'},
+        'font.capitalization': {'Font.MixedCase'},
+        'lineHeight': {'1', '1.0'},
+        'leftPadding': {'0'},
+        'rightPadding': {'0'},
+    },
+}
+
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+IDENTIFIER_PATTERN = re.compile(r'(?<![\w$.])[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*')
+OPERATOR_PATTERN = re.compile(r'[-+*/%?<>=!&|(]')
+ARITHMETIC_PATTERN = re.compile(r'^[\w$.\s()+\-*/]+$')
+# Names that mean the same anywhere in a view file
+GLOBAL_NAMES = frozenset(['root', 'Window', 'Math', 'Qt', 'true', 'false', 'null', 'undefined'])
+# The geometry of another item, like the md_lbl_* x and y chains
+GEOMETRY_PROPS = ('x', 'y', 'width', 'height')
+GEOMETRY_REFERENCE_PATTERN = re.compile(r'(?<![\w$.])([A-Za-z_$][\w$]*)\.(x|y|width|height)(?![\w$])')
+SIMPLE_VALUE_PATTERN = re.compile(r'^[\w$.]+$')
+# A position relative to the screen, like `1.5 * root.width`
+SCREEN_FACTOR_PATTERN = re.compile(r'^(?:(\d+(?:\.\d*)?)\s*\*\s*)?root\.(width|height)$')
+
+HOISTED_PROPERTY_PREFIX = 'hoisted'
+
+# Disabled with --no-optimize
+OPTIMIZE_VIEWS = True
+
+# View name -> [default values dropped, references inlined, expressions shared, bindings using them]
+BINDING_STATS: Dict[str, List[int]] = {}
+# View name -> item name -> times removed
+REMOVED_ITEMS: Dict[str, Dict[str, int]] = {}
+
+
+def is_handler(key: str) -> bool:
+    name = key.rsplit('.', 1)[-1]
+    return len(name) > 2 and name.startswith('on') and name[2].isupper()
+
+
+def collect_ids(qitem: QmlItem, ids: Set[str]):
+    # Only the items outside of delegates and other components can be referred from the root
+    if 'id' in qitem.props:
+        ids.add(str(qitem.props['id']))
+    for child in qitem.childs:
+        collect_ids(child, ids)
+
+
+def iter_items(qitem: QmlItem):
+    yield qitem
+    for child in qitem.childs:
+        yield from iter_items(child)
+    for child in qitem.named_childs.values():
+        yield from iter_items(child)
+
+
+def can_hoist(value: str, root_names: Set[str]) -> bool:
+    if any(ch in value for ch in '{};\n`'):
+        return False
+
+    code = STRING_LITERAL_PATTERN.sub("''", value)
+    if not OPERATOR_PATTERN.search(code):
+        return False
+    # Every name has to mean the same on the root as on the item
+    return all(name.split('.', 1)[0] in root_names for name in IDENTIFIER_PATTERN.findall(code))
+
+
+def drop_default_props(qroot: QmlItem) -> int:
+    dropped = 0
+    for qitem in iter_items(qroot):
+        if qitem.typename not in QUICK_ITEM_TYPES:
+            continue
+        type_defaults = TYPE_DEFAULTS.get(qitem.typename, {})
+        for key in list(qitem.props):
+            defaults = type_defaults.get(key) or ITEM_DEFAULTS.get(key)
+            if defaults and str(qitem.props[key]) in defaults:
+                del qitem.props[key]
+                dropped += 1
+    return dropped
+
+
+def is_screen_expression(value: str) -> bool:
+    # Depends on nothing but the screen, so it means the same on every item
+    code = STRING_LITERAL_PATTERN.sub("''", value)
+    return all(name.split('.', 1)[0] in GLOBAL_NAMES for name in IDENTIFIER_PATTERN.findall(code))
+
+
+def find_geometry_targets(items: Dict[str, QmlItem]) -> Dict[str, str]:
+    # The geometry bindings that only depend on the screen once the
+    # references to other items are inlined in them, resolved in the order
+    # they depend on each other. Values in a reference cycle never are.
+    values: Dict[str, str] = {}
+    for item_id, qitem in items.items():
+        # Anchors and animations can move an item away from its bindings
+        if any(key.startswith('anchors.') for key in qitem.props) or qitem.extra_lines:
+            continue
+        for prop in GEOMETRY_PROPS:
+            value = str(qitem.props.get(prop, '')).strip()
+            if value:
+                values[f"{item_id}.{prop}"] = value
+
+    # Name -> the names its value refers to, and the other way around
+    pending: Dict[str, Set[str]] = {}
+    users: Dict[str, List[str]] = {}
+    for name, value in values.items():
+        item_id = name.split('.', 1)[0]
+        pending[name] = {match.group(0) for match in GEOMETRY_REFERENCE_PATTERN.finditer(value)
+                         if match.group(0) in values and match.group(1) != item_id}
+        for ref in pending[name]:
+            users.setdefault(ref, []).append(name)
+
+    targets: Dict[str, str] = {}
+    ready = [name for name, refs in pending.items() if not refs]
+    # The values that don't refer to another target stay the same
+    has_refs = {name for name, refs in pending.items() if refs}
+    while ready:
+        name = ready.pop()
+        value = values[name]
+        if name in has_refs:
+            value = inline_references(value, targets, items, items[name.split('.', 1)[0]])[0]
+        if is_screen_expression(value):
+            targets[name] = value
+        for user in users.get(name, []):
+            pending[user].discard(name)
+            if not pending[user]:
+                ready.append(user)
+    return targets
+
+
+def inline_references(whole: str, targets: Dict[str, str], items: Dict[str, QmlItem],
+                      qitem: QmlItem) -> Tuple[str, int]:
+    inlined = 0
+
+    def replace(match) -> str:
+        nonlocal inlined
+        value = targets.get(match.group(0))
+        if value is None or items[match.group(1)] is qitem:
+            return match.group(0)
+        inlined += 1
+        if match.group(0) == whole or SIMPLE_VALUE_PATTERN.match(value):
+            return value
+        return f"({value})"
+
+    return GEOMETRY_REFERENCE_PATTERN.sub(replace, whole), inlined
+
+
+def inline_geometry_references(qroot: QmlItem) -> int:
+    # Replaces the references to the position or size of another item with
+    # its expression, when that only depends on the screen size. This cuts
+    # the chains of items waiting for each other, eg. every detail label's
+    # x refers to the previous label's x.
+    items = {str(qitem.props['id']): qitem for qitem in qroot.childs if 'id' in qitem.props}
+    targets = find_geometry_targets(items)
+    if not targets:
+        return 0
+
+    inlined = 0
+    for qitem in qroot.childs:
+        for prop in GEOMETRY_PROPS:
+            whole = str(qitem.props.get(prop, '')).strip()
+            if '.' not in whole:
+                continue
+            value, count = inline_references(whole, targets, items, qitem)
+            if count:
+                qitem.props[prop] = value
+                inlined += count
+    return inlined
+
+
+def hoist_common_bindings(qroot: QmlItem) -> List[int]:
+    root_names = set(GLOBAL_NAMES)
+    collect_ids(qroot, root_names)
+
+    # Most values are the same on many items
+    hoistable: Dict[str, bool] = {}
+    occurrences: Dict[str, int] = {}
+    for qitem in iter_items(qroot):
+        if qitem is qroot:
+            continue
+        for key, value in sorted(qitem.props.items()):
+            value = str(value).strip()
+            if not OPERATOR_PATTERN.search(value) or key == 'id' or is_handler(key):
+                continue
+            if value not in hoistable:
+                hoistable[value] = can_hoist(value, root_names)
+            if hoistable[value]:
+                occurrences[value] = occurrences.get(value, 0) + 1
+
+    shared_names: Dict[str, str] = {}
+    for value, count in occurrences.items():
+        if count < 2:
+            continue
+        name = f"{HOISTED_PROPERTY_PREFIX}{len(shared_names)}"
+        shared_names[value] = name
+        # String concatenations can look like arithmetic too
+        is_number = not STRING_LITERAL_PATTERN.search(value) and ARITHMETIC_PATTERN.match(value)
+        prop_type = 'real' if is_number else 'var'
+        qroot.props[f"readonly property {prop_type} {name}"] = value
+
+    uses = 0
+    for qitem in iter_items(qroot):
+        if qitem is qroot:
+            continue
+        for key, value in qitem.props.items():
+            name = shared_names.get(str(value).strip())
+            if name:
+                qitem.props[key] = f"root.{name}"
+                uses += 1
+
+    # The items still have a binding each, but to a property that is
+    # evaluated once instead of to the whole expression
+    return [len(shared_names), uses]
+
+
+def collect_references(qitem: QmlItem, refs: Dict[str, int]):
+    # The number of other items referring to each name
+    names = set()
+    for key, value in qitem.props.items():
+        if key != 'id':
+            names.update(IDENTIFIER_PATTERN.findall(STRING_LITERAL_PATTERN.sub("''", str(value))))
+    for line in qitem.leading_lines + qitem.extra_lines:
+        names.update(IDENTIFIER_PATTERN.findall(STRING_LITERAL_PATTERN.sub("''", line)))
+
+    heads = {name.split('.', 1)[0] for name in names}
+    heads.discard(str(qitem.props.get('id')))
+    for head in heads:
+        refs[head] = refs.get(head, 0) + 1
+
+    for child in qitem.childs:
+        collect_references(child, refs)
+    for child in qitem.named_childs.values():
+        collect_references(child, refs)
+
+
+def iter_ids(qitem: QmlItem):
+    for child in iter_items(qitem):
+        if 'id' in child.props:
+            yield str(child.props['id'])
+
+
+def is_constant_zero(value: str) -> bool:
+    try:
+        return float(value) == 0
+    except ValueError:
+        return False
+
+
+def screen_factor(value: str, side: str) -> Optional[float]:
+    # The constant position as a fraction of the screen size, if it is one
+    match = SCREEN_FACTOR_PATTERN.match(value)
+    if match and match.group(2) == side:
+        return float(match.group(1) or 1)
+    target = get_layout_target()
+    if match or not target:
+        return None
+    try:
+        return float(value) / target[0 if side == 'width' else 1]
+    except ValueError:
+        return None
+
+
+def is_offscreen(qitem: QmlItem) -> bool:
+    # The root clips its items, so the ones placed after its right or
+    # bottom edge are never seen, unless something can move them back
+    if any(key.startswith('anchors.') or key in ('rotation', 'scale', 'transform') for key in qitem.props):
+        return False
+    if qitem.leading_lines or qitem.extra_lines:
+        return False
+    if any(key in ('x', 'y') for child in iter_items(qitem) if child is not qitem for key in child.props):
+        return False
+
+    for pos_key, side in [('x', 'width'), ('y', 'height')]:
+        factor = screen_factor(str(qitem.props.get(pos_key, '')).strip(), side)
+        if factor is not None and factor >= 1.0:
+            return True
+    return False
+
+
+def is_dead_item(qitem: QmlItem) -> bool:
+    hidden = str(qitem.props.get('visible', 'true')).strip() == 'false' or is_offscreen(qitem)
+    # Transparent items still take the key events and animations can
+    # bring them back
+    if not hidden and is_constant_zero(str(qitem.props.get('opacity', '1')).strip()):
+        uses_opacity = any('opacity' in line for line in qitem.leading_lines + qitem.extra_lines)
+        has_focus = any(key == 'focus' or key.startswith('Keys.') for child in iter_items(qitem)
+                        for key in child.props)
+        hidden = not uses_opacity and not has_focus
+    # Handlers may have side effects even on a hidden item
+    return hidden and not any(is_handler(key) for child in iter_items(qitem) for key in child.props)
+
+
+def remove_dead_items(viewname: str, qroot: QmlItem):
+    # Removes the items of the root that can never be seen and that no
+    # other item refers to, which may in turn free the items they refer to.
+    # Only the references from outside of an item keep it.
+    candidates = []
+    for qitem in qroot.childs:
+        if is_dead_item(qitem):
+            own_refs: Dict[str, int] = {}
+            collect_references(qitem, own_refs)
+            candidates.append((qitem, own_refs, list(iter_ids(qitem))))
+    if not candidates:
+        return
+
+    refs: Dict[str, int] = {}
+    collect_references(qroot, refs)
+
+    # Id -> the candidate it belongs to, checked again when a reference to it goes away
+    owners = {item_id: idx for idx, (_, _, item_ids) in enumerate(candidates) for item_id in item_ids}
+    removed: Set[int] = set()
+    pending = list(range(len(candidates)))
+    while pending:
+        idx = pending.pop()
+        _, own_refs, item_ids = candidates[idx]
+        if idx in removed or any(refs.get(item_id, 0) != own_refs.get(item_id, 0) for item_id in item_ids):
+            continue
+        removed.add(idx)
+        for name, count in own_refs.items():
+            refs[name] -= count
+            if name in owners:
+                pending.append(owners[name])
+
+    if not removed:
+        return
+    removed_items = [candidates[idx][0] for idx in sorted(removed)]
+    removed_ids = {id(qitem) for qitem in removed_items}
+    qroot.childs[:] = [qitem for qitem in qroot.childs if id(qitem) not in removed_ids]
+    names = REMOVED_ITEMS.setdefault(viewname, {})
+    for qitem in removed_items:
+        name = str(qitem.props.get('id', qitem.typename))
+        names[name] = names.get(name, 0) + 1
+
+
+def set_optimize_views(enabled: bool):
+    global OPTIMIZE_VIEWS
+    OPTIMIZE_VIEWS = enabled
+
+
+def optimize_view(viewname: str, qroot: QmlItem):
+    # Removes the items that are never visible, inlines the positions that
+    # only depend on the screen, drops the properties that restate the
+    # defaults and moves the expressions used more than once to shared
+    # properties of the root
+    if not OPTIMIZE_VIEWS:
+        return
+
+    remove_dead_items(viewname, qroot)
+    inlined = inline_geometry_references(qroot)
+    dropped = drop_default_props(qroot)
+    shared, uses = hoist_common_bindings(qroot)
+
+    stats = BINDING_STATS.setdefault(viewname, [0, 0, 0, 0])
+    for idx, value in enumerate([dropped, inlined, shared, uses]):
+        stats[idx] += value
+
+
+def take_removed_items() -> Dict[str, Dict[str, int]]:
+    items = dict(REMOVED_ITEMS)
+    REMOVED_ITEMS.clear()
+    return items
+
+
+def add_removed_items(items: Dict[str, Dict[str, int]]):
+    for viewname, names in items.items():
+        total = REMOVED_ITEMS.setdefault(viewname, {})
+        for name, count in names.items():
+            total[name] = total.get(name, 0) + count
+
+
+def take_binding_stats() -> Dict[str, List[int]]:
+    # Used by worker processes to send their statistics back
+    stats = dict(BINDING_STATS)
+    BINDING_STATS.clear()
+    return stats
+
+
+def add_binding_stats(stats: Dict[str, List[int]]):
+    for viewname, values in stats.items():
+        total = BINDING_STATS.setdefault(viewname, [0, 0, 0, 0])
+        for idx, value in enumerate(values):
+            total[idx] += value
+
+
+def print_binding_report():
+    if not BINDING_STATS:
+        return
+
+    print_info("Bindings simplified in the views:")
+    for viewname, (dropped, inlined, shared, uses) in sorted(BINDING_STATS.items()):
+        print_info(f"  - {viewname}: {dropped} default values dropped, {inlined} references to other items "
+                   f"inlined, {uses} bindings reading {shared} shared expressions")
+
+
+def print_removed_items_report():
+    if not REMOVED_ITEMS:
+        return
+
+    print_info("Items never visible, removed from the views:")
+    for viewname, names in sorted(REMOVED_ITEMS.items()):
+        print_info(f"  - {viewname}: {sum(names.values())} ({', '.join(sorted(names))})")
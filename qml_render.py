@@ -1,39 +1,55 @@
+import ast
+import io
 import re
 from static import DEFAULT_PROPS, DEFAULT_ZORDERS
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from es_items import Element
+from image_size import calc_source_size, render_prop_source_size
+from tracing import traced
 
 
 class QmlItem:
     def __init__(self, typename: str, props=None):
         self.typename = typename
         self.props: Dict[str, str] = props if props else {}
+        self.leading_lines: List[str] = []
         self.extra_lines: List[str] = []
         self.childs: List[QmlItem] = []
         self.named_childs: Dict[str, QmlItem] = {}
 
-    def render(self, indent=0):
-        lines = [f"{'  ' * indent}{self.typename} {{"]
+    def write(self, sink, indent=0, name=None):
+        # Every line is written with a leading newline, so the output
+        # can be appended to previous content without a trailing one
+        prefix = f"{name}: " if name else ''
+        sink.write(f"\n{'  ' * indent}{prefix}{self.typename} {{")
+        self.write_contents(sink, indent)
 
-        subindent = '  ' * (indent + 1)
+    def write_contents(self, sink, indent=0):
+        # Everything after the opening line, up to the closing brace
+        indent_str = '\n' + '  ' * indent
+        subindent = indent_str + '  '
 
-        prop_lines = [f"{subindent}{key}: {val}" for key, val in self.props.items()]
-        prop_lines.sort()
-        lines.extend(prop_lines)
+        for line in self.leading_lines:
+            sink.write(f"{subindent}{line}")
 
-        extra_lines = [f"{subindent}{line}" for line in self.extra_lines]
-        lines.extend(extra_lines)
+        for line in sorted(f"{key}: {val}" for key, val in self.props.items()):
+            sink.write(f"{subindent}{line}")
 
-        for name, qitem in self.named_childs.items():
-            sublines = qitem.render(indent + 1)
-            sublines[0] = f"{subindent}{name}: {qitem.typename} {{"
-            lines.extend(sublines)
+        for line in self.extra_lines:
+            sink.write(f"{subindent}{line}")
+
+        for child_name, qitem in self.named_childs.items():
+            qitem.write(sink, indent + 1, child_name)
 
         for qitem in self.childs:
-            lines.extend(qitem.render(indent + 1))
+            qitem.write(sink, indent + 1)
+
+        sink.write(f"{indent_str}}}")
 
-        lines.append(f"{'  ' * indent}}}")
-        return lines
+    def render(self, indent=0) -> List[str]:
+        buffer = io.StringIO()
+        self.write(buffer, indent)
+        return buffer.getvalue().split('\n')[1:]
 
 
 def print_debug(elem):
@@ -167,6 +183,9 @@ def create_color_overlay(elem, elem_id: str) -> List[QmlItem]:
     opacity = elem.params['color'].opacity
     if opacity < 1.0:
         blend.props['opacity'] = opacity
+    # The source is always hidden, the blend shows it
+    if 'visible' in elem.params and not elem.params['visible']:
+        blend.props['visible'] = 'false'
 
     return [colorfill, blend]
 
@@ -208,6 +227,7 @@ def render_prop_textinfo(elem: Element, props: Dict[str, str]):
         props['lineHeight'] = elem.params['lineSpacing']
 
 
+@traced
 def create_image(viewname: str, elem: Element) -> List[QmlItem]:
     qitem = QmlItem('Image')
     qitem.props = get_defaults(viewname, elem.type, elem.name)
@@ -256,6 +276,15 @@ def create_image(viewname: str, elem: Element) -> List[QmlItem]:
     if 'tile' in elem.params and elem.params['tile']:
         qitem.props['fillMode'] = 'Image.Tile'
 
+    # Tiled images are drawn at their own size
+    if 'path' in elem.params and qitem.props.get('fillMode') != 'Image.Tile':
+        if 'size' in elem.params:
+            pair = elem.params['size']
+            render_prop_source_size(qitem.props, elem.params['path'], pair.a, pair.b, crop=True)
+        elif 'maxSize' in elem.params:
+            pair = elem.params['maxSize']
+            render_prop_source_size(qitem.props, elem.params['path'], pair.a, pair.b, crop=False)
+
     siblings = []
 
     if 'color' in elem.params:
@@ -271,6 +300,7 @@ def create_image(viewname: str, elem: Element) -> List[QmlItem]:
     return [qitem] + siblings
 
 
+@traced
 def create_text(viewname: str, elem: Element) -> List[QmlItem]:
     qitem = QmlItem('Text')
     qitem.props = get_defaults(viewname, elem.type, elem.name)
@@ -331,6 +361,7 @@ def create_text(viewname: str, elem: Element) -> List[QmlItem]:
     return [qitem]
 
 
+@traced
 def create_rating(viewname: str, elem: Element) -> List[QmlItem]:
     qitem = QmlItem('RatingBar')
     qitem.props = get_defaults(viewname, elem.type, elem.name)
@@ -362,6 +393,14 @@ def create_rating(viewname: str, elem: Element) -> List[QmlItem]:
 #            qitem.props['width'] = 'height * 5'
 #            qitem.props['height'] = f"{pair.b} * root.height"
 
+        # The stars are squares as high as the item
+        star_width, star_height = (pair.a / 5, 0.0) if pair.b == 0.0 else (0.0, pair.b)
+        for kind in ['filled', 'unfilled']:
+            if f'{kind}Path' in elem.params:
+                size = calc_source_size(elem.params[f'{kind}Path'], star_width, star_height, crop=True)
+                if size:
+                    qitem.props[f'{kind}SourceSize'] = f"Qt.size({size[0]}, {size[1]})"
+
     siblings = []
 
     if 'color' in elem.params:
@@ -374,6 +413,7 @@ def create_rating(viewname: str, elem: Element) -> List[QmlItem]:
     return [qitem] + siblings
 
 
+@traced
 def create_helpsystem(viewname: str, elem: Element) -> List[QmlItem]:
     return []  # Not supported yet
 
@@ -395,6 +435,7 @@ def create_helpsystem(viewname: str, elem: Element) -> List[QmlItem]:
     ]
 
 
+@traced
 def create_textlist(viewname: str, elem: Element) -> List[QmlItem]:
     qlist = QmlItem('ListView')
     qlist.props = get_defaults(viewname, elem.type, elem.name)
@@ -426,6 +467,10 @@ def create_textlist(viewname: str, elem: Element) -> List[QmlItem]:
         if 'selectorImageTile' in elem.params:
             if elem.params['selectorImageTile']:
                 qhighlight.props['fillMode'] = "Image.PreserveAspectFit"
+        if 'size' in elem.params and 'fontSize' in elem.params:
+            render_prop_source_size(qhighlight.props, elem.params['selectorImagePath'],
+                                    elem.params['size'].a, elem.params['fontSize'] * 1.5,
+                                    crop=qhighlight.props.get('fillMode') != "Image.PreserveAspectFit")
     else:
         qhighlight.typename = 'Rectangle'
         qhighlight.props = {
@@ -458,6 +503,7 @@ def create_textlist(viewname: str, elem: Element) -> List[QmlItem]:
     return [qlist]
 
 
+@traced
 def create_scrolltext(viewname: str, elem: Element) -> List[QmlItem]:
     qtext = create_text(viewname, elem)[0]
 
@@ -497,7 +543,8 @@ def create_scrolltext(viewname: str, elem: Element) -> List[QmlItem]:
     return [qcontainer]
 
 
-def render_view_items(viewname: str, elems: List[Element]) -> List[str]:
+@traced
+def create_view_items(viewname: str, elems: List[Element]) -> QmlItem:
     elems = sorted(elems, key=es_zorder)
     # print(f"  - {viewname}: {len(elems)} elem")
 
@@ -549,9 +596,180 @@ def render_view_items(viewname: str, elems: List[Element]) -> List[str]:
             continue
         print_debug(elem)
 
-    return [
-        "import QtQuick 2.6",
-        "import QtGraphicalEffects 1.0",
-        "import '../__components'",
-        "import '../__components/helpers.js' as Helpers",
-    ] + qroot.render()
+    fold_layout_bindings(qroot)
+    return qroot
+
+
+# The screen size the layout bindings are folded into constants for,
+# None keeps them as bindings
+LAYOUT_TARGET: Optional[Tuple[int, int]] = None
+
+
+def set_layout_target(resolution: Optional[Tuple[int, int]]):
+    global LAYOUT_TARGET
+    LAYOUT_TARGET = resolution
+
+
+def get_layout_target() -> Optional[Tuple[int, int]]:
+    return LAYOUT_TARGET
+
+
+FLICKABLE_TYPES = frozenset(['Flickable', 'ListView', 'GridView', 'PathView'])
+
+FOLD_OPERATORS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+}
+
+
+def eval_layout_node(node, names: Dict[str, float], used_names: List[str]) -> Optional[float]:
+    # Only plain arithmetic on numbers and known sizes can be folded
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, (int, float)) and not isinstance(node.value, bool) else None
+    if isinstance(node, ast.Name):
+        name = node.id
+    elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        name = f"{node.value.id}.{node.attr}"
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = eval_layout_node(node.operand, names, used_names)
+        return -value if value is not None else None
+    elif isinstance(node, ast.BinOp) and type(node.op) in FOLD_OPERATORS:
+        left = eval_layout_node(node.left, names, used_names)
+        right = eval_layout_node(node.right, names, used_names)
+        if left is None or right is None or (isinstance(node.op, ast.Div) and right == 0):
+            return None
+        return FOLD_OPERATORS[type(node.op)](left, right)
+    else:
+        return None
+
+    used_names.append(name)
+    return names.get(name)
+
+
+def fold_layout_expression(expr, names: Dict[str, float]) -> Optional[int]:
+    try:
+        tree = ast.parse(str(expr).strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    used_names: List[str] = []
+    value = eval_layout_node(tree.body, names, used_names)
+    # Expressions without a size are not pixel values (eg. opacity)
+    if value is None or not used_names:
+        return None
+    return round(value)
+
+
+def fold_item_bindings(qitem: QmlItem, names: Dict[str, float]):
+    # The other properties may depend on the item's own size, and
+    # the sides may depend on each other
+    names = {name: value for name, value in names.items() if name not in ('width', 'height')}
+    for _ in range(2):
+        for side in ['width', 'height']:
+            if side in qitem.props and side not in names:
+                folded = fold_layout_expression(qitem.props[side], names)
+                if folded is not None:
+                    qitem.props[side] = str(folded)
+                    names[side] = folded
+
+    for key, val in qitem.props.items():
+        if key not in ('width', 'height'):
+            folded = fold_layout_expression(val, names)
+            if folded is not None:
+                qitem.props[key] = str(folded)
+
+    # Delegates and the children of flickables are placed in a content
+    # item, so their parent's size is not the size of this item
+    component_names = {name: value for name, value in names.items() if name.startswith(('root.', 'Window.'))}
+    child_names = dict(component_names)
+    if qitem.typename not in FLICKABLE_TYPES:
+        for side in ['width', 'height']:
+            if side in names:
+                child_names[f'parent.{side}'] = names[side]
+    for child in qitem.childs:
+        fold_item_bindings(child, child_names)
+    for child in qitem.named_childs.values():
+        fold_item_bindings(child, component_names)
+
+
+def fold_layout_bindings(qroot: QmlItem):
+    # Replaces the position and size bindings with pixel constants when
+    # the screen size is known; the ones that depend on runtime values,
+    # like the size of an image, are kept
+    if not LAYOUT_TARGET:
+        return
+
+    width, height = LAYOUT_TARGET
+    fold_item_bindings(qroot, {
+        'root.width': width,
+        'root.height': height,
+        'Window.width': width,
+        'Window.height': height,
+    })
+
+
+VIEW_IMPORTS: List[str] = [
+    "import QtQuick 2.6",
+    "import QtGraphicalEffects 1.0",
+    "import '../__components'",
+    "import '../__components/helpers.js' as Helpers",
+]
+
+
+def write_view(qroot: QmlItem, sink):
+    sink.write('\n'.join(VIEW_IMPORTS))
+    qroot.write(sink)
+
+
+def render_view(qroot: QmlItem) -> str:
+    buffer = io.StringIO()
+    write_view(qroot, buffer)
+    return buffer.getvalue()
+
+
+# Quoted strings and numbers in the property values
+QML_LITERAL_PATTERN = re.compile(r"'(?:[^'\\\n]|\\.)*'|(?<![\w.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])")
+# Encloses the literals in the rendered views. XML can't contain it, so
+# it can't come from the theme.
+LITERAL_MARK = '\x00'
+
+
+class ViewText():
+    # A rendered view, with its literals marked, so that the views that
+    # differ only in those can be merged
+    __slots__ = ('imports', 'root_line', 'body')
+
+    def __init__(self, imports: List[str], root_line: str, body: str):
+        self.imports = imports
+        # The opening line of the root item
+        self.root_line = root_line
+        # The rest of the root item
+        self.body = body
+
+    def parts(self) -> List[str]:
+        # Even indices are the structure of the view, odd indices the literals
+        return self.body.split(LITERAL_MARK)
+
+    def text(self) -> str:
+        return '\n'.join(self.imports) + self.root_line + self.body.replace(LITERAL_MARK, '')
+
+
+def mark_literals(qitem: QmlItem):
+    for key, value in qitem.props.items():
+        qitem.props[key] = QML_LITERAL_PATTERN.sub(lambda match: LITERAL_MARK + match.group(0) + LITERAL_MARK,
+                                                   str(value))
+    for child in qitem.childs:
+        mark_literals(child)
+    for child in qitem.named_childs.values():
+        mark_literals(child)
+
+
+def render_view_text(qroot: QmlItem) -> ViewText:
+    # Only the property values can vary between merged views, everything
+    # else is part of the structure
+    mark_literals(qroot)
+    buffer = io.StringIO()
+    qroot.write_contents(buffer)
+    return ViewText(VIEW_IMPORTS, f"\n{qroot.typename} {{", buffer.getvalue())
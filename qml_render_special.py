@@ -1,6 +1,8 @@
 from es_items import Element
 from qml_render import QmlItem, render_prop_id, render_prop_pos, render_rgba_color, create_text
 from typing import Dict
+from image_size import render_prop_source_box
+from tracing import traced
 
 
 DEFAULT_PROPS: Dict[str, Dict[str, str]] = {
@@ -108,7 +110,7 @@ def create_carousel_path(carousel: QmlItem, elem: Element) -> QmlItem:
 
 def create_carousel_delegate(carousel: QmlItem, elem: Element) -> QmlItem:
     qdelegate = QmlItem('Item')
-    qdelegate.props = DEFAULT_PROPS['pathview_delegate']
+    qdelegate.props = dict(DEFAULT_PROPS['pathview_delegate'])
 
     if elem.params['type'].startswith('horizontal'):
         qdelegate.props.update({
@@ -161,22 +163,26 @@ def create_carousel_delegate(carousel: QmlItem, elem: Element) -> QmlItem:
 
     default_key = 'pathview_delegate_image'
     qinnerbox.childs.append(QmlItem('Image'))
-    qinnerbox.childs[-1].props = DEFAULT_PROPS[default_key]
+    qinnerbox.childs[-1].props = dict(DEFAULT_PROPS[default_key])
     qinnerbox.childs[-1].extra_lines = ['Behavior on opacity { NumberAnimation { duration: 120 } }']
+    # The logos are only known at runtime, so the largest box they can be drawn in is used
+    scale = max(elem.params['logoScale'], 1.0)
+    render_prop_source_box(qinnerbox.childs[-1].props, size.a * scale, size.b * scale)
 
     default_key = 'pathview_delegate_text'
     qinnerbox.childs.append(QmlItem('Text'))
-    qinnerbox.childs[-1].props = DEFAULT_PROPS[default_key]
+    qinnerbox.childs[-1].props = dict(DEFAULT_PROPS[default_key])
 
     qdelegate.childs.append(qinnerbox)
     return qdelegate
 
 
+@traced
 def create_systemcarousel(elem: Element) -> QmlItem:
     # TODO input check
 
     qcontainer = QmlItem('Rectangle')
-    qcontainer.props = DEFAULT_PROPS['container']
+    qcontainer.props = dict(DEFAULT_PROPS['container'])
 
     render_prop_id(elem, qcontainer.props)
     render_prop_pos(elem, qcontainer.props)
@@ -189,7 +195,7 @@ def create_systemcarousel(elem: Element) -> QmlItem:
     })
 
     qcarousel = QmlItem('PathView')
-    qcarousel.props = DEFAULT_PROPS['pathview']
+    qcarousel.props = dict(DEFAULT_PROPS['pathview'])
 
     if elem.params['type'].startswith('horizontal'):
         qcarousel.props.update({
@@ -215,6 +221,7 @@ def create_systemcarousel(elem: Element) -> QmlItem:
     return qcontainer
 
 
+@traced
 def create_systeminfo(elem: Element) -> QmlItem:
     qitem = create_text('system', elem)[0]
     qitem.props.update({
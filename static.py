@@ -452,9 +452,9 @@ FocusScope {
   readonly property var g_PLATFORM_LOGOS: new Map([
     $$PLATFORM_LOGOS$$
   ])
-  readonly property var g_PLATFORMS_WITH_SYSTEM_SCREEN: [
-    $$PLATFORMS_WITH_SYSTEMS$$
-  ]
+  readonly property var g_SYSTEM_VIEW_FILES: new Map([
+    $$SYSTEM_VIEW_FILES$$
+  ])
   signal enter()
   enabled: focus
   Carousel {
@@ -468,12 +468,12 @@ FocusScope {
       width: PathView.view.width
       height: PathView.view.height
       asynchronous: true
-      readonly property string sourceDir: {
-        if (g_PLATFORMS_WITH_SYSTEM_SCREEN.includes(modelData.shortName)) return modelData.shortName;
-        if (g_PLATFORMS_WITH_SYSTEM_SCREEN.includes('__generic')) return '__generic';
+      readonly property string sourceFile: {
+        if (g_SYSTEM_VIEW_FILES.has(modelData.shortName)) return g_SYSTEM_VIEW_FILES.get(modelData.shortName);
+        if (g_SYSTEM_VIEW_FILES.has('__generic')) return g_SYSTEM_VIEW_FILES.get('__generic');
         return null;
       }
-      source: (sourceDir && `../${sourceDir}/system.qml`) || 'MissingSystemView.qml'
+      source: (sourceFile && `../${sourceFile}`) || 'MissingSystemView.qml'
     }
   }
 $$SYSTEMCAROUSEL$$
@@ -487,9 +487,9 @@ FocusScope {
   id: root
   property alias model: systemAxis.model
   property alias currentIndex: systemAxis.currentIndex
-  readonly property var g_PLATFORMS_WITH_DETAILS_SCREEN: [
-    $$PLATFORMS_WITH_DETAILS$$
-  ]
+  readonly property var g_DETAILS_VIEW_FILES: new Map([
+    $$DETAILS_VIEW_FILES$$
+  ])
   signal leave()
   Keys.onPressed: {
     if (!event.isAutoRepeat && api.keys.isCancel(event)) {
@@ -506,12 +506,12 @@ FocusScope {
       width: systemAxis.width
       height: systemAxis.height
       asynchronous: true
-      readonly property string sourceDir: {
-        if (g_PLATFORMS_WITH_DETAILS_SCREEN.includes(modelData.shortName)) return modelData.shortName;
-        if (g_PLATFORMS_WITH_DETAILS_SCREEN.includes('__generic')) return '__generic';
+      readonly property string sourceFile: {
+        if (g_DETAILS_VIEW_FILES.has(modelData.shortName)) return g_DETAILS_VIEW_FILES.get(modelData.shortName);
+        if (g_DETAILS_VIEW_FILES.has('__generic')) return g_DETAILS_VIEW_FILES.get('__generic');
         return null;
       }
-      source: (sourceDir && `../${sourceDir}/detailed.qml`) || 'MissingDetailedView.qml'
+      source: (sourceFile && `../${sourceFile}`) || 'MissingDetailedView.qml'
     }
   }
 }
@@ -556,6 +556,8 @@ Item {
   property real percentage
   property string filledPath
   property string unfilledPath
+  property size filledSourceSize
+  property size unfilledSourceSize
   Row {
     id: filledPart
     anchors { top: parent.top; bottom: parent.bottom; left: parent.left }
@@ -568,6 +570,7 @@ Item {
         width: height
         asynchronous: true
         source: filledPath
+        sourceSize: filledSourceSize
         smooth: false
       }
     }
@@ -584,6 +587,7 @@ Item {
         width: height
         asynchronous: true
         source: unfilledPath
+        sourceSize: unfilledSourceSize
         smooth: false
       }
     }
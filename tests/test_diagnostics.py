@@ -0,0 +1,68 @@
+import io
+import json
+import sys
+
+import pytest
+
+import errors
+from errors import CapturedOutput, add_diagnostics, buffer_diagnostics, print_diagnostics_summary, \
+    print_error, record_diagnostics, stream_can_color, take_diagnostics, warn, write_diagnostics_report
+
+
+@pytest.fixture(autouse=True)
+def diagnostics():
+    errors.DIAGNOSTICS.clear()
+    yield
+    errors.DIAGNOSTICS.clear()
+
+
+def test_repeated_messages_printed_once(capsys):
+    for platform in ('nes', 'snes', 'gba', 'n64', 'psx'):
+        warn("Found an empty include", f'{platform}/theme.xml')
+    print_error("Invalid color value: `red`")
+
+    assert capsys.readouterr().err.splitlines() == ["[warning] nes/theme.xml: Found an empty include",
+                                                    "[error] Invalid color value: `red`"]
+    print_diagnostics_summary()
+    assert capsys.readouterr().out.splitlines() == [
+        "[i] Repeated messages:",
+        "[i]   - 5x [warning] Found an empty include",
+        "[i]       in nes/theme.xml",
+        "[i]       in snes/theme.xml",
+        "[i]       in gba/theme.xml",
+        "[i]       and 2 more",
+    ]
+
+
+def test_report_has_every_location(tmp_path):
+    for platform in ('nes', 'snes', 'gba', 'n64', 'nes'):
+        warn("Found an empty include", f'{platform}/theme.xml')
+    write_diagnostics_report(str(tmp_path / 'report.json'))
+
+    with open(tmp_path / 'report.json') as file:
+        assert json.load(file) == [{'level': 'warning', 'message': "Found an empty include", 'count': 5,
+                                    'locations': ['nes/theme.xml', 'snes/theme.xml', 'gba/theme.xml',
+                                                  'n64/theme.xml']}]
+
+
+def test_buffered_and_recorded_messages(capsys):
+    take_diagnostics()
+    buffer_diagnostics()
+    try:
+        with record_diagnostics() as records:
+            warn("Found an empty include", 'nes/theme.xml')
+    finally:
+        buffer_diagnostics(False)
+    buffered = take_diagnostics()
+    assert buffered == records == [('warning', "Found an empty include", 'nes/theme.xml')]
+    assert capsys.readouterr().err == ''
+    assert errors.RECORDED_DIAGNOSTICS == []
+
+    add_diagnostics(buffered)
+    assert capsys.readouterr().err == "[warning] nes/theme.xml: Found an empty include\n"
+
+
+def test_stream_colors():
+    assert stream_can_color(CapturedOutput(False)) is False
+    assert stream_can_color(io.StringIO()) is False
+    assert stream_can_color(CapturedOutput(True)) == (sys.platform != 'win32')
@@ -0,0 +1,86 @@
+import struct
+import sys
+from unittest import mock
+
+import pytest
+
+import convert
+import image_size
+from image_size import build_asset_index, calc_source_size, parse_resolution, read_image_size, set_asset_index, \
+    set_image_resolution
+
+
+def run_convert(theme_dir, out_dir, *args):
+    with mock.patch.object(sys, 'argv', ['convert.py', str(theme_dir), str(out_dir), *args]):
+        convert.main()
+
+
+def write_theme(theme_dir):
+    (theme_dir / 'nes').mkdir(parents=True)
+    (theme_dir / 'nes' / 'theme.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+
+
+def test_asset_index_only_built_for_image_resolution(tmp_path):
+    write_theme(tmp_path / 'theme')
+    with mock.patch.object(convert, 'build_asset_index', wraps=convert.build_asset_index) as build:
+        run_convert(tmp_path / 'theme', tmp_path / 'out')
+        assert not build.called
+        run_convert(tmp_path / 'theme', tmp_path / 'out', '--image-resolution', '1280x720')
+        assert build.call_count == 1
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480) + bytes(5)
+GIF = b'GIF89a' + struct.pack('<HH', 32, 16) + bytes(3)
+# With an APP0 segment and a padding byte before the start of the frame
+JPEG = b'\xFF\xD8\xFF\xE0' + struct.pack('>H', 16) + bytes(14) + \
+    b'\xFF\xFF\xC2' + struct.pack('>H', 17) + b'\x08' + struct.pack('>HH', 300, 400) + bytes(10)
+SVG = b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg"\n  width="24px" height=\'12.4\'>'
+SVG_VIEWBOX = b'<svg viewBox="0,0,100,50" width="100%">'
+
+
+@pytest.fixture
+def images(tmp_path):
+    for name, data in (('a.png', PNG), ('a.gif', GIF), ('a.jpg', JPEG), ('a.svg', SVG),
+                       ('b.svg', SVG_VIEWBOX), ('c.svg', b'<svg>'), ('d.png', PNG[:20]), ('e.txt', PNG)):
+        (tmp_path / name).write_bytes(data)
+    set_asset_index(build_asset_index(str(tmp_path)))
+    yield tmp_path
+    set_asset_index(frozenset())
+    set_image_resolution(None)
+
+
+def test_image_headers(images):
+    assert image_size.ASSET_INDEX == {str(images / name) for name in
+                                      ('a.png', 'a.gif', 'a.jpg', 'a.svg', 'b.svg', 'c.svg', 'd.png')}
+    assert read_image_size(str(images / 'a.png')) == (640, 480)
+    assert read_image_size(str(images / 'a.gif')) == (32, 16)
+    assert read_image_size(str(images / 'a.jpg')) == (400, 300)
+    assert read_image_size(str(images / 'a.svg')) == (24, 12)
+    assert read_image_size(str(images / 'b.svg')) == (100, 50)
+    # Unknown, truncated and unindexed files
+    assert read_image_size(str(images / 'c.svg')) is None
+    assert read_image_size(str(images / 'd.png')) is None
+    assert read_image_size(str(images / 'e.txt')) is None
+    assert read_image_size(str(images / 'missing.png')) is None
+
+
+def test_source_size(images):
+    path = str(images / 'a.png')
+    assert calc_source_size(path, 0.25, 0.25, crop=False) is None
+
+    set_image_resolution(parse_resolution('1280x720'))
+    assert calc_source_size(path, 0.25, 0.25, crop=False) == (240, 180)
+    assert calc_source_size(path, 0.25, 0.25, crop=True) == (320, 240)
+    assert calc_source_size(path, 0.25, 0, crop=False) == (320, 240)
+    assert calc_source_size(path, 0, 0, crop=False) is None
+    # Never scaled up
+    assert calc_source_size(path, 1.0, 1.0, crop=False) is None
+    assert calc_source_size(str(images / 'c.svg'), 0.25, 0.25, crop=False) is None
+
+
+def test_resolutions():
+    assert parse_resolution('1920x1080') == (1920, 1080)
+    assert parse_resolution('None') is None
+    for text in ('1920', '0x1080', '1920x1080p'):
+        with pytest.raises(ValueError):
+            parse_resolution(text)
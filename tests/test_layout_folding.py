@@ -0,0 +1,57 @@
+import pytest
+
+from qml_render import QmlItem, fold_layout_bindings, fold_layout_expression, set_layout_target
+
+
+@pytest.fixture
+def target():
+    set_layout_target((1280, 720))
+    yield
+    set_layout_target(None)
+
+
+def test_fold_expression():
+    names = {'root.width': 1280, 'root.height': 720}
+    assert fold_layout_expression('0.5 * root.width - 0.25 * root.height', names) == 460
+    assert fold_layout_expression('0.5', names) is None
+    assert fold_layout_expression('height * (implicitWidth || 1)', names) is None
+    assert fold_layout_expression('modelData.width', names) is None
+
+
+def test_nothing_folded_without_target():
+    qitem = QmlItem('Item', {'width': '0.5 * root.width'})
+    fold_layout_bindings(qitem)
+    assert qitem.props['width'] == '0.5 * root.width'
+
+
+def test_sizes_and_children(target):
+    qroot = QmlItem('FocusScope', {'id': 'root'})
+    qitem = QmlItem('Text', {'width': '0.5 * root.width', 'x': '0.25 * root.width - 0.5 * width',
+                             'height': 'implicitHeight'})
+    qitem.childs.append(QmlItem('Rectangle', {'width': 'parent.width', 'height': 'parent.height'}))
+    qroot.childs.append(qitem)
+
+    fold_layout_bindings(qroot)
+    assert qitem.props == {'width': '640', 'x': '0', 'height': 'implicitHeight'}
+    assert qitem.childs[0].props == {'width': '640', 'height': 'parent.height'}
+
+
+@pytest.mark.parametrize('typename', ['Flickable', 'ListView', 'PathView'])
+def test_content_items_keep_parent_bindings(target, typename):
+    qview = QmlItem(typename, {'width': '0.5 * root.width', 'height': '0.5 * root.height'})
+    qcontent = QmlItem('Text', {'width': 'parent.width', 'x': '0.1 * root.width'})
+    qdelegate = QmlItem('Text', {'width': 'parent.width', 'height': '0.05 * root.height'})
+    qview.childs.append(qcontent)
+    qview.named_childs['delegate'] = qdelegate
+
+    fold_layout_bindings(qview)
+    assert qview.props == {'width': '640', 'height': '360'}
+    assert qcontent.props == {'width': 'parent.width', 'x': '128'}
+    assert qdelegate.props == {'width': 'parent.width', 'height': '36'}
+
+
+def test_item_delegates_keep_parent_bindings(target):
+    qitem = QmlItem('Item', {'width': '0.5 * root.width'})
+    qitem.named_childs['delegate'] = QmlItem('Text', {'width': 'parent.width'})
+    fold_layout_bindings(qitem)
+    assert qitem.named_childs['delegate'].props == {'width': 'parent.width'}
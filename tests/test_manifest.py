@@ -0,0 +1,158 @@
+import sys
+from unittest import mock
+
+import pytest
+
+import convert
+import errors
+import manifest
+from manifest import load_manifest, get_platform_entries, get_generated_files
+
+
+THEME_XML = """<theme>
+  <formatVersion>4</formatVersion>
+  <view name="detailed">
+    <text name="md_lbl_rating"><color>{color}</color></text>
+  </view>
+  {extra}
+</theme>
+"""
+DEFAULT_OPTIONS = {'image_resolution': None, 'target': None, 'optimize': True}
+
+
+def write_theme(theme_dir, color='FF0000', platform='nes', extra=''):
+    (theme_dir / platform).mkdir(parents=True, exist_ok=True)
+    (theme_dir / platform / 'theme.xml').write_text(THEME_XML.format(color=color, extra=extra))
+
+
+def run_convert(theme_dir, out_dir, *args):
+    # Every run reports its own warnings
+    errors.DIAGNOSTICS.clear()
+    with mock.patch.object(sys, 'argv', ['convert.py', str(theme_dir), str(out_dir), *args]):
+        convert.main()
+
+
+@pytest.fixture
+def theme(tmp_path):
+    theme_dir = tmp_path / 'theme'
+    write_theme(theme_dir)
+    return theme_dir
+
+
+def test_unchanged_platforms_are_skipped(theme, tmp_path, capsys):
+    out_dir = tmp_path / 'out'
+    run_convert(theme, out_dir)
+    capsys.readouterr()
+
+    run_convert(theme, out_dir)
+    assert "Platform `nes` is up to date" in capsys.readouterr().out
+
+    write_theme(theme, color='00FF00')
+    run_convert(theme, out_dir)
+    assert "Processing platform `nes`" in capsys.readouterr().out
+
+
+def test_changes_during_the_run_are_converted_next_time(theme, tmp_path, capsys):
+    out_dir = tmp_path / 'out'
+    dump_files = convert.dump_files
+
+    def edit_and_dump(*args):
+        # The platform was already read
+        write_theme(theme, color='00FF00')
+        return dump_files(*args)
+
+    with mock.patch.object(convert, 'dump_files', side_effect=edit_and_dump):
+        run_convert(theme, out_dir)
+    capsys.readouterr()
+    run_convert(theme, out_dir)
+    assert "Processing platform `nes`" in capsys.readouterr().out
+
+
+def test_interrupted_run_invalidates_manifest(theme, tmp_path, capsys):
+    out_dir = tmp_path / 'out'
+    run_convert(theme, out_dir)
+    files = get_generated_files(load_manifest(str(out_dir)))
+    assert 'theme.qml' in files
+
+    write_theme(theme, color='00FF00')
+    with mock.patch.object(convert, 'write_atomic', side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            run_convert(theme, out_dir)
+
+    # The platform is not trusted anymore, but the files are still known
+    manifest = load_manifest(str(out_dir))
+    assert get_platform_entries(manifest, str(theme), DEFAULT_OPTIONS) == {}
+    assert get_generated_files(manifest) == files
+
+    capsys.readouterr()
+    write_theme(theme)
+    run_convert(theme, out_dir)
+    assert "Processing platform `nes`" in capsys.readouterr().out
+
+
+def test_interrupted_low_memory_run_invalidates_manifest(theme, tmp_path):
+    out_dir = tmp_path / 'out'
+    run_convert(theme, out_dir)
+
+    write_theme(theme, color='00FF00')
+    with mock.patch.object(convert, 'write_atomic', side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            run_convert(theme, out_dir, '--low-memory')
+
+    assert 'platforms' not in load_manifest(str(out_dir))
+
+
+def test_converter_change_invalidates_platforms(theme, tmp_path, capsys):
+    out_dir = tmp_path / 'out'
+    run_convert(theme, out_dir)
+    data = load_manifest(str(out_dir))
+    assert get_platform_entries(data, str(theme), DEFAULT_OPTIONS)
+
+    data['converter'] = 'older'
+    manifest.write_manifest(str(out_dir), data)
+    assert get_platform_entries(load_manifest(str(out_dir)), str(theme), DEFAULT_OPTIONS) == {}
+    assert get_generated_files(load_manifest(str(out_dir))) == data['files']
+
+    capsys.readouterr()
+    run_convert(theme, out_dir)
+    assert "Processing platform `nes`" in capsys.readouterr().out
+
+
+def test_snippets_from_first_readable_platform(theme, tmp_path, capsys):
+    out_dir = tmp_path / 'out'
+    write_theme(theme, extra='<view name="system"><carousel name="systemcarousel">'
+                             '<color>123456</color></carousel></view>')
+    (theme / '0broken').mkdir()
+    (theme / '0broken' / 'theme.xml').write_text('<theme>')
+    run_convert(theme, out_dir)
+    assert "Platform `0broken` skipped" in capsys.readouterr().err
+    assert '123456' in (out_dir / '__components' / 'SystemView.qml').read_text()
+
+    # Also when the platform is up to date
+    run_convert(theme, out_dir)
+    assert "Platform `nes` is up to date" in capsys.readouterr().out
+    assert '123456' in (out_dir / '__components' / 'SystemView.qml').read_text()
+
+
+def test_cached_platforms_report_unsupported_elements(tmp_path, capsys):
+    theme = tmp_path / 'theme'
+    write_theme(theme, extra='<view name="detailed"><video name="md_video"/></view>')
+    run_convert(theme, tmp_path / 'out')
+    assert "  - video" in capsys.readouterr().err
+
+    run_convert(theme, tmp_path / 'out')
+    output = capsys.readouterr()
+    assert "Platform `nes` is up to date" in output.out
+    assert "  - video" in output.err
+
+
+def test_cached_platforms_report_their_warnings(tmp_path, capsys):
+    theme = tmp_path / 'theme'
+    write_theme(theme, extra='<include> </include>')
+    run_convert(theme, tmp_path / 'out')
+    assert "Found an empty include" in capsys.readouterr().err
+
+    run_convert(theme, tmp_path / 'out')
+    output = capsys.readouterr()
+    assert "Platform `nes` is up to date" in output.out
+    assert "nes/theme.xml: Found an empty include" in output.err
@@ -0,0 +1,46 @@
+import sys
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+import convert
+import memreport
+import tracing
+
+
+@pytest.fixture
+def theme(tmp_path):
+    (tmp_path / 'theme' / 'nes').mkdir(parents=True)
+    (tmp_path / 'theme' / 'nes' / 'theme.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+    yield tmp_path / 'theme'
+    memreport.enable_memory_report(False)
+    memreport.MEMORY_STAGES.clear()
+    memreport.WORKER_PEAK = None
+    tracemalloc.stop()
+    tracing.enable_tracing(False)
+    tracing.TRACE_EVENTS.clear()
+
+
+def run_convert(theme, tmp_path, *args):
+    with mock.patch.object(sys, 'argv', ['convert.py', str(theme), str(tmp_path / 'out'), '--mem-report', *args]):
+        convert.main()
+
+
+def test_every_variant_is_reported(theme, tmp_path):
+    run_convert(theme, tmp_path, '--trace', str(tmp_path / 'trace.json'), '--target', '1280x720',
+                '--target', '640x480')
+    stages = [name for name, _, _, _ in memreport.MEMORY_STAGES]
+    spans = {event['name'] for event in tracing.TRACE_EVENTS}
+
+    assert stages == ['find_platforms',
+                      'create_qml (1280x720)', 'dump_files (1280x720)',
+                      'create_qml (640x480)', 'dump_files (640x480)']
+    assert {'create_qml (1280x720)', 'create_qml (640x480)'} <= spans
+
+
+def test_workers_are_reported(theme, tmp_path, capsys):
+    run_convert(theme, tmp_path, '-j', '2')
+    output = capsys.readouterr().out
+    assert "(of the main process only" in output
+    assert "Peak traced memory of a worker process: " in output
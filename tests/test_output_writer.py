@@ -0,0 +1,73 @@
+import os
+import stat
+from unittest import mock
+
+import pytest
+
+from convert import OutputWriter, dump_files, write_atomic
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    dump_files({'a.qml': 'A', 'sub/b.qml': 'B'}, str(tmp_path))
+    mtime = os.stat(tmp_path / 'a.qml').st_mtime_ns
+
+    writer = OutputWriter(str(tmp_path))
+    writer.write('a.qml', 'A')
+    writer.write('sub/b.qml', 'B2')
+    assert (writer.written, writer.skipped) == (1, 1)
+    assert os.stat(tmp_path / 'a.qml').st_mtime_ns == mtime
+    assert read(tmp_path / 'sub/b.qml').endswith('B2')
+
+
+def test_only_previously_generated_files_are_removed(tmp_path):
+    previous = dump_files({'a.qml': 'A', '__views/old.qml': 'old', 'theme.cfg': 'x'}, str(tmp_path))
+
+    # Files and directories the converter didn't create
+    (tmp_path / 'notes.txt').write_text('mine')
+    (tmp_path / 'empty_user_dir').mkdir()
+    (tmp_path / '.git' / 'refs').mkdir(parents=True)
+    (tmp_path / 'user.qml').write_text('// Autogenerated content, do not edit by hand!\n')
+
+    generated = dump_files({'a.qml': 'A', 'theme.cfg': 'x'}, str(tmp_path), previous)
+    assert generated == {'a.qml', 'theme.cfg'}
+
+    assert not (tmp_path / '__views').exists()
+    assert (tmp_path / 'a.qml').exists()
+    assert (tmp_path / 'notes.txt').exists()
+    assert (tmp_path / 'empty_user_dir').is_dir()
+    assert (tmp_path / '.git' / 'refs').is_dir()
+    assert (tmp_path / 'user.qml').exists()
+
+
+def test_edited_or_escaping_files_are_kept(tmp_path):
+    previous = dump_files({'a.qml': 'A'}, str(tmp_path / 'out'))
+    (tmp_path / 'out' / 'a.qml').write_text('edited by hand')
+    (tmp_path / 'outside.qml').write_text('// Autogenerated content, do not edit by hand!\n')
+
+    dump_files({}, str(tmp_path / 'out'), list(previous) + ['../outside.qml'])
+    assert (tmp_path / 'out' / 'a.qml').exists()
+    assert (tmp_path / 'outside.qml').exists()
+
+
+def test_write_atomic_sets_mode(tmp_path):
+    path = str(tmp_path / 'file.qml')
+    write_atomic(path, b'data', 0o644)
+    assert read(path) == 'data'
+    if os.name == 'posix':
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_write_atomic_failure_keeps_original(tmp_path):
+    path = tmp_path / 'file.qml'
+    path.write_text('original')
+
+    with mock.patch('os.replace', side_effect=OSError('disk full')), \
+            mock.patch('os.unlink', side_effect=OSError('busy')):
+        with pytest.raises(OSError, match='disk full'):
+            write_atomic(str(path), b'new', 0o644)
+    assert read(path) == 'original'
@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import errors
+from es_reader import find_platforms
+
+
+def write_theme(tmp_path):
+    for name, color in [('snes', '00FF00'), ('gba', 'FF0000'), ('nes', '0000FF')]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'theme.xml').write_text(
+            "<theme><formatVersion>4</formatVersion><include>../common.xml</include>"
+            f"<view name='basic'><text name='logoText'><color>{color}</color></text></view></theme>")
+    (tmp_path / 'common.xml').write_text(
+        "<theme><formatVersion>4</formatVersion><view name='basic'><video name='md_video'/></view></theme>")
+    (tmp_path / '0broken').mkdir()
+    (tmp_path / '0broken' / 'theme.xml').write_text("<theme>")
+
+
+def summary(platforms):
+    return [(platform.name, platform.views['basic']['logoText'].params['color'].color, sorted(platform.deps),
+             sorted(platform.unsupported_elems)) for platform in platforms]
+
+
+def test_workers_read_like_serial(tmp_path, capsys):
+    write_theme(tmp_path)
+    errors.DIAGNOSTICS.clear()
+    serial = summary(find_platforms(str(tmp_path)))
+    serial_output = capsys.readouterr()
+
+    errors.DIAGNOSTICS.clear()
+    with ProcessPoolExecutor(2) as executor:
+        parallel = summary(find_platforms(str(tmp_path), executor))
+    parallel_output = capsys.readouterr()
+
+    assert [name for name, _, _, _ in parallel] == ['gba', 'nes', 'snes']
+    assert parallel == serial
+    assert parallel_output.out == serial_output.out
+    assert parallel_output.err == serial_output.err
+    assert "Platform `0broken` skipped" in parallel_output.err
+
+
+def test_skipped_platforms_not_read(tmp_path, capsys):
+    write_theme(tmp_path)
+    with ProcessPoolExecutor(2) as executor:
+        platforms = find_platforms(str(tmp_path), executor, skipped_platforms={'0broken', 'nes'})
+    assert [platform.name for platform in platforms] == ['gba', 'snes']
+    assert "`nes`" not in capsys.readouterr().out
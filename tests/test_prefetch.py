@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from es_reader import XML_CACHE_SIZE, XmlCache, XmlPrefetcher, find_platforms, open_prefetcher, read_platform_captured
+
+
+def write_platforms(tmp_path, names):
+    for name in names:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'theme.xml').write_text(
+            "<theme><formatVersion>4</formatVersion><include>../common.xml</include></theme>")
+    (tmp_path / 'common.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+
+
+def prefetch_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('ThreadPoolExecutor')]
+
+
+def test_no_prefetch_with_one_job():
+    with open_prefetcher(1) as prefetcher:
+        assert prefetcher is None
+
+
+def test_prefetched_file_is_used(tmp_path):
+    (tmp_path / 'theme.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+    with XmlPrefetcher(2) as prefetcher:
+        cache = XmlCache(prefetcher)
+        cache.prefetch(str(tmp_path / 'theme.xml'))
+        cache.load(str(tmp_path / 'theme.xml'))
+        assert not prefetcher.pending
+
+
+def test_serial_reading_stops_the_threads(tmp_path):
+    write_platforms(tmp_path, ['gba', 'nes', 'snes'])
+    assert [platform.name for platform in find_platforms(str(tmp_path), io_jobs=4)] == ['gba', 'nes', 'snes']
+    assert not prefetch_threads()
+
+
+def test_worker_task_stops_the_threads(tmp_path):
+    write_platforms(tmp_path, ['nes'])
+    task = (str(tmp_path), 'nes', str(tmp_path / 'nes' / 'theme.xml'), None, False, 4, XML_CACHE_SIZE)
+    # Run the task on a thread, like a worker process would
+    with ThreadPoolExecutor(1, thread_name_prefix='worker') as executor:
+        platform = executor.submit(read_platform_captured, task).result()[0]
+    assert platform.name == 'nes'
+    assert not prefetch_threads()
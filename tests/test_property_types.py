@@ -0,0 +1,64 @@
+import pickle
+
+import pytest
+
+import errors
+from es_items import Element, Platform, create_default_view_template, create_default_views
+from es_reader import XmlCache, read_theme_xml
+from property_types import Color, NormPair, NormRect, parse_cache_stats, parse_param
+from static import PropType
+
+
+def test_values_are_immutable_and_hashable():
+    color = Color('FF000080')
+    assert (color.color, color.opacity) == ('FF0000', 128 / 255)
+    with pytest.raises(AttributeError):
+        color.opacity = 1.0
+    with pytest.raises(AttributeError):
+        color.extra = True
+
+    assert NormPair('0.5 0.25') == NormPair('0.50 0.250')
+    assert len({NormPair('0.5 0.25'), NormPair('0.50 0.250'), NormRect('0.5 0.25')}) == 2
+    assert NormRect('0.5 0.25').values() == (0.5, 0.25, 0.5, 0.25)
+    assert pickle.loads(pickle.dumps(color)) == color
+
+
+def test_no_instance_dicts():
+    for value in (Color('FFFFFF'), NormPair('0 0'), NormRect('0 0 1 1'), Element('logo', 'image'),
+                  Platform('nes', {})):
+        assert not hasattr(value, '__dict__')
+
+
+def test_shared_elements_copied_on_write(tmp_path):
+    (tmp_path / 'theme.xml').write_text(
+        "<theme><formatVersion>4</formatVersion><view name='detailed'>"
+        "<image name='logo'><pos>0.1 0.2</pos></image></view></theme>")
+    template = create_default_view_template(str(tmp_path))
+    template_params = dict(template['detailed']['logo'].params)
+    views = create_default_views(str(tmp_path))
+    read_theme_xml(str(tmp_path), str(tmp_path / 'theme.xml'), {}, views, XmlCache(), {})
+
+    logo = views['detailed']['logo']
+    assert not logo.is_shared and logo is not template['detailed']['logo']
+    assert logo.params['pos'] == NormPair('0.1 0.2')
+    assert template['detailed']['logo'].params == template_params
+    # Untouched elements are still shared
+    assert views['detailed']['background'] is template['detailed']['background']
+
+
+def test_parsed_values_are_shared():
+    color = parse_param('/theme/nes', PropType.COLOR, 'A1B2C3')
+    hits, misses = parse_cache_stats()
+    # Only the paths depend on the directory
+    assert parse_param('/theme/snes', PropType.COLOR, 'A1B2C3') is color
+    assert parse_param('/theme/nes', PropType.PATH, 'logo.svg') == '/theme/nes/logo.svg'
+    assert parse_param('/theme/snes', PropType.PATH, 'logo.svg') == '/theme/snes/logo.svg'
+    assert parse_param('/theme/nes', PropType.STRING, 'A1B2C3') == 'A1B2C3'
+    assert parse_cache_stats() == (hits + 1, misses + 2)
+
+
+def test_invalid_values_reported_every_time():
+    errors.DIAGNOSTICS.clear()
+    assert parse_param('/theme/nes', PropType.NORMALIZED_PAIR, '0.5') is None
+    assert parse_param('/theme/snes', PropType.NORMALIZED_PAIR, '0.5') is None
+    assert errors.DIAGNOSTICS[('error', 'Invalid normalized pair: `0.5`')].count == 2
@@ -0,0 +1,146 @@
+from es_reader import XmlCache, read_theme_xml
+from qml_optimize import drop_default_props, hoist_common_bindings, inline_geometry_references, optimize_view, \
+    remove_dead_items, set_optimize_views, take_binding_stats, take_removed_items
+from qml_render import QmlItem, create_view_items
+
+
+def make_view(*childs: QmlItem) -> QmlItem:
+    qroot = QmlItem('FocusScope', {'id': 'root'})
+    qroot.childs.extend(childs)
+    return qroot
+
+
+def test_string_concatenation_is_var():
+    qroot = make_view(QmlItem('Text', {'text': "'foo' + Qt.platform.os"}),
+                      QmlItem('Text', {'text': "'foo' + Qt.platform.os"}),
+                      QmlItem('Item', {'width': '0.5 * root.width'}),
+                      QmlItem('Item', {'width': '0.5 * root.width'}))
+
+    assert hoist_common_bindings(qroot) == [2, 4]
+    assert qroot.props["readonly property var hoisted0"] == "'foo' + Qt.platform.os"
+    assert qroot.props["readonly property real hoisted1"] == '0.5 * root.width'
+    assert qroot.childs[0].props['text'] == 'root.hoisted0'
+    assert qroot.childs[3].props['width'] == 'root.hoisted1'
+
+
+def test_position_chains_inlined():
+    rating = QmlItem('Text', {'id': 'md_lbl_rating', 'x': '0.01 * root.width', 'y': '0.625 * root.height'})
+    released = QmlItem('Text', {'id': 'md_lbl_releasedate', 'x': 'md_lbl_rating.x',
+                                'y': 'md_lbl_rating.y + md_lbl_rating.height'})
+    developer = QmlItem('Text', {'id': 'md_lbl_developer', 'x': 'md_lbl_releasedate.x'})
+    value = QmlItem('Text', {'id': 'md_rating', 'x': 'md_lbl_rating.x + md_lbl_rating.width'})
+    qroot = make_view(rating, released, developer, value)
+
+    assert inline_geometry_references(qroot) == 4
+    assert released.props == {'id': 'md_lbl_releasedate', 'x': '0.01 * root.width',
+                              'y': '(0.625 * root.height) + md_lbl_rating.height'}
+    assert developer.props['x'] == '0.01 * root.width'
+    assert value.props['x'] == '(0.01 * root.width) + md_lbl_rating.width'
+
+
+def test_anchored_and_animated_items_not_inlined():
+    anchored = QmlItem('Item', {'id': 'anchored', 'x': '0.1 * root.width', 'anchors.left': 'parent.left'})
+    animated = QmlItem('Item', {'id': 'animated', 'x': '0.1 * root.width'})
+    animated.extra_lines.append('Behavior on x { NumberAnimation {} }')
+    relative = QmlItem('Item', {'id': 'relative', 'x': 'gamelist.width'})
+    follower = QmlItem('Item', {'x': 'anchored.x + animated.x + relative.x', 'y': 'follower.y'})
+    qroot = make_view(anchored, animated, relative, follower)
+
+    assert inline_geometry_references(qroot) == 0
+    assert follower.props == {'x': 'anchored.x + animated.x + relative.x', 'y': 'follower.y'}
+
+
+def test_reference_cycles_not_inlined():
+    first = QmlItem('Item', {'id': 'first', 'x': 'second.x', 'y': '0.1 * root.height'})
+    second = QmlItem('Item', {'id': 'second', 'x': 'first.x + first.width', 'y': 'first.y'})
+    qroot = make_view(first, second)
+
+    assert inline_geometry_references(qroot) == 1
+    assert first.props == {'id': 'first', 'x': 'second.x', 'y': '0.1 * root.height'}
+    assert second.props == {'id': 'second', 'x': 'first.x + first.width', 'y': '0.1 * root.height'}
+
+
+def test_defaults_dropped():
+    qitem = QmlItem('Image', {'x': '0', 'opacity': '1.0', 'smooth': 'true', 'fillMode': 'Image.Stretch',
+                              'visible': 'status == Image.Ready'})
+
+    assert drop_default_props(make_view(qitem)) == 4
+    assert qitem.props == {'visible': 'status == Image.Ready'}
+
+
+def make_dead_item_view(with_dead_items: bool) -> QmlItem:
+    qroot = make_view(QmlItem('Image', {'id': 'background', 'source': "'bg.png'"}))
+    if with_dead_items:
+        hidden = QmlItem('Image', {'id': 'x_hidden', 'visible': 'false'})
+        hidden.childs.append(QmlItem('Rectangle', {'id': 'x_hidden_frame', 'width': 'x_hidden.width'}))
+        qroot.childs.append(hidden)
+        qroot.childs.append(QmlItem('Text', {'id': 'x_transparent', 'opacity': '0.0'}))
+        qroot.childs.append(QmlItem('Rectangle', {'visible': 'false', 'anchors.fill': 'x_hidden'}))
+        qroot.childs.append(QmlItem('Image', {'id': 'x_right', 'x': '1.5 * root.width', 'y': '0.2 * root.height'}))
+        qroot.childs.append(QmlItem('Image', {'id': 'x_below', 'x': '0.1 * root.width', 'y': 'root.height'}))
+    qroot.childs.append(QmlItem('Text', {'id': 'md_name', 'text': 'currentGame.title', 'x': '0.5 * root.width'}))
+    return qroot
+
+
+def test_dead_items_removed():
+    qroot = make_dead_item_view(True)
+    take_removed_items()
+    remove_dead_items('detailed', qroot)
+
+    assert qroot.render() == make_dead_item_view(False).render()
+    assert take_removed_items() == {'detailed': {'Rectangle': 1, 'x_below': 1, 'x_hidden': 1, 'x_right': 1,
+                                                 'x_transparent': 1}}
+
+
+def test_live_items_kept():
+    qroot = make_view(QmlItem('Image', {'id': 'x_hidden', 'visible': 'false'}),
+                      QmlItem('Rectangle', {'id': 'x_child', 'visible': 'false'}),
+                      QmlItem('ShaderEffectSource', {'sourceItem': 'x_hidden', 'width': 'x_nested.width'}),
+                      QmlItem('Text', {'id': 'x_fading', 'opacity': '0'}),
+                      QmlItem('ListView', {'id': 'gamelist', 'opacity': '0', 'focus': 'true'}),
+                      QmlItem('Item', {'visible': 'false', 'Component.onCompleted': 'api.memory.set(1)'}),
+                      QmlItem('Item', {'visible': '!gamelist.visible', 'opacity': 'root.width > 0 ? 0 : 1'}),
+                      QmlItem('Item', {'x': '-2.0 * root.width'}),
+                      QmlItem('Item', {'x': '1.5 * root.width', 'anchors.right': 'parent.right'}),
+                      QmlItem('Item', {'x': '1.5 * root.width', 'rotation': '180'}),
+                      QmlItem('Item', {'x': '1.5 * root.width'}),
+                      QmlItem('Item', {'x': '1.5 * root.height'}),
+                      QmlItem('Item', {'y': '0.99 * root.height'}))
+    qroot.childs[1].childs.append(QmlItem('Item', {'id': 'x_nested'}))
+    qroot.childs[3].extra_lines.append('Behavior on opacity { NumberAnimation { duration: 120 } }')
+    qroot.childs[10].extra_lines.append('Behavior on x { NumberAnimation {} }')
+    before = qroot.render()
+    take_removed_items()
+    remove_dead_items('detailed', qroot)
+
+    assert qroot.render() == before
+    assert take_removed_items() == {}
+
+
+def test_optimizations_disabled():
+    qroot = make_dead_item_view(True)
+    before = qroot.render()
+    take_binding_stats()
+    set_optimize_views(False)
+    try:
+        optimize_view('detailed', qroot)
+    finally:
+        set_optimize_views(True)
+
+    assert qroot.render() == before
+    assert take_removed_items() == {}
+    assert take_binding_stats() == {}
+
+
+def test_hidden_colorized_image_removed(tmp_path):
+    (tmp_path / 'theme.xml').write_text(
+        "<theme><formatVersion>4</formatVersion><view name='detailed'>"
+        "<image name='cover' extra='true'><path>./logo.png</path><color>FF000080</color>"
+        "<visible>false</visible></image></view></theme>")
+    views = {}
+    read_theme_xml(str(tmp_path), str(tmp_path / 'theme.xml'), {}, views, XmlCache(), {})
+    qroot = create_view_items('detailed', views['detailed'].values())
+    take_removed_items()
+    remove_dead_items('detailed', qroot)
+
+    assert take_removed_items() == {'detailed': {'Blend': 1, 'color_x_cover': 1, 'x_cover': 1}}
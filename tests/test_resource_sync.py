@@ -0,0 +1,55 @@
+import os
+from unittest import mock
+
+import pytest
+
+import convert
+from convert import sync_dir, sync_file
+
+
+@pytest.fixture
+def resources(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'fonts').mkdir(parents=True)
+    (src / 'fonts' / 'font.ttf').write_bytes(b'font')
+    (src / 'logo.svg').write_text('<svg/>')
+    return src
+
+
+def test_only_changed_files_are_synced(resources, tmp_path):
+    dst = tmp_path / 'dst'
+    assert sync_dir(str(resources), str(dst)) == 2
+    assert (dst / 'fonts' / 'font.ttf').read_bytes() == b'font'
+    assert sync_dir(str(resources), str(dst)) == 0
+
+    (resources / 'logo.svg').write_text('<svg></svg>')
+    assert sync_dir(str(resources), str(dst)) == 1
+    assert (dst / 'logo.svg').read_text() == '<svg></svg>'
+
+
+def test_same_contents_not_copied_again(resources, tmp_path):
+    dst = tmp_path / 'dst'
+    sync_dir(str(resources), str(dst))
+    os.utime(resources / 'logo.svg', ns=(0, 0))
+
+    assert sync_dir(str(resources), str(dst)) == 0
+    assert (dst / 'logo.svg').stat().st_mtime_ns == 0
+
+
+def test_hardlinked_files(resources, tmp_path):
+    dst = tmp_path / 'dst'
+    dst.mkdir()
+    (dst / 'logo.svg').write_text('old')
+    assert sync_file(str(resources / 'logo.svg'), str(dst / 'logo.svg'), 'hardlink')
+    assert os.path.samefile(resources / 'logo.svg', dst / 'logo.svg')
+    assert not sync_file(str(resources / 'logo.svg'), str(dst / 'logo.svg'), 'hardlink')
+
+
+@pytest.mark.parametrize('error', [OSError, ImportError])
+def test_unsupported_reflinks_are_copied(resources, tmp_path, error):
+    dst = tmp_path / 'dst'
+    dst.mkdir()
+    with mock.patch.object(convert, 'reflink_file', side_effect=error):
+        assert sync_file(str(resources / 'logo.svg'), str(dst / 'logo.svg'), 'reflink')
+    assert (dst / 'logo.svg').read_text() == '<svg/>'
+    assert not os.path.samefile(resources / 'logo.svg', dst / 'logo.svg')
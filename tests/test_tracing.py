@@ -0,0 +1,61 @@
+import json
+import sys
+from unittest import mock
+
+import pytest
+
+import convert
+import tracing
+from tracing import enable_tracing, span, take_events, traced
+
+
+@pytest.fixture
+def trace():
+    take_events()
+    enable_tracing()
+    yield
+    enable_tracing(False)
+    take_events()
+
+
+@traced
+def failing():
+    raise RuntimeError('failed')
+
+
+def test_nothing_recorded_when_disabled():
+    take_events()
+    with span('outer'):
+        pass
+    assert take_events() == []
+
+
+def test_spans_recorded(trace):
+    with span('outer', 'stage', variant='1080p'):
+        with pytest.raises(RuntimeError):
+            failing()
+
+    inner, outer = take_events()
+    assert (inner['name'], inner['cat']) == ('failing', __name__)
+    assert (outer['name'], outer['cat'], outer['args']) == ('outer', 'stage', {'variant': '1080p'})
+    assert outer['ts'] <= inner['ts'] and inner['dur'] <= outer['dur']
+    assert tracing.TRACE_EVENTS == []
+
+
+def test_trace_written(tmp_path):
+    (tmp_path / 'theme' / 'nes').mkdir(parents=True)
+    (tmp_path / 'theme' / 'nes' / 'theme.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+    argv = ['convert.py', str(tmp_path / 'theme'), str(tmp_path / 'out'), '--trace', str(tmp_path / 'trace.json')]
+    take_events()
+    try:
+        with mock.patch.object(sys, 'argv', argv):
+            convert.main()
+    finally:
+        enable_tracing(False)
+        take_events()
+
+    with open(tmp_path / 'trace.json') as file:
+        data = json.load(file)
+    names = {event['name'] for event in data['traceEvents']}
+    assert {'find_platforms', 'read_platform', 'copy_resources'} <= names
+    assert all(event['ph'] == 'X' for event in data['traceEvents'])
@@ -0,0 +1,55 @@
+from es_reader import XmlCache, compile_variables, read_theme_xml, replace_variables
+
+
+def write_theme(tmp_path, files):
+    for name, contents in files.items():
+        (tmp_path / name).write_text(f"<theme><formatVersion>4</formatVersion>{contents}</theme>")
+
+
+def read_text_color(tmp_path):
+    variables, views = {}, {}
+    read_theme_xml(str(tmp_path), str(tmp_path / 'theme.xml'), variables, views, XmlCache(), {})
+    return views['basic']['logoText'].params['color'].color
+
+
+def test_include_does_not_override_includer(tmp_path):
+    write_theme(tmp_path, {
+        'theme.xml': "<variables><main>112233</main></variables><include>./common.xml</include>",
+        'common.xml': "<variables><main>445566</main></variables>"
+                      "<view name='basic'><text name='logoText'><color>${main}</color></text></view>",
+    })
+    assert read_text_color(tmp_path) == '112233'
+
+
+def test_first_include_defines_the_variable(tmp_path):
+    write_theme(tmp_path, {
+        'theme.xml': "<include>./colors.xml</include><include>./other.xml</include>"
+                     "<view name='basic'><text name='logoText'><color>${main}</color></text></view>",
+        'colors.xml': "<variables><main>445566</main></variables>",
+        'other.xml': "<variables><main>778899</main></variables>",
+    })
+    assert read_text_color(tmp_path) == '445566'
+
+
+def test_includer_sees_included_variables(tmp_path):
+    write_theme(tmp_path, {
+        'theme.xml': "<include>./colors.xml</include>"
+                     "<view name='basic'><text name='logoText'><color>${main}</color></text></view>",
+        'colors.xml': "<variables><main>445566</main></variables>",
+    })
+    assert read_text_color(tmp_path) == '445566'
+
+
+def test_compiled_parts():
+    assert compile_variables('FFFFFF') == ('FFFFFF',)
+    assert compile_variables('${a}${b}') == ('', 'a', '', 'b', '')
+    assert compile_variables('./art/${system.theme}/${logo}.svg') == ('./art/${system.theme}/', 'logo', '.svg')
+
+
+def test_variables_replaced():
+    variables = {'a': 'A', 'b': '${a}'}
+    assert replace_variables('x ${a} y ${a}', variables) == 'x A y A'
+    assert replace_variables('${missing}!', variables) == '!'
+    # The values are not expanded again
+    assert replace_variables('${b}', variables) == '${a}'
+    assert replace_variables('${system.name}: ${a}', variables) == '${system.name}: A'
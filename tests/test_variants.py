@@ -0,0 +1,26 @@
+import sys
+from unittest import mock
+
+from convert import create_variants, parse_args
+
+
+def variants_for(*args):
+    with mock.patch.object(sys, 'argv', ['convert.py', 'theme', 'out', *args]):
+        return create_variants(parse_args())
+
+
+def test_single_target_keeps_full_size_images():
+    [variant] = variants_for('--target', '1280x720')
+    assert variant.out_dir == 'out'
+    assert variant.settings == ((1280, 720), None, True)
+
+
+def test_every_target_gets_its_image_resolution():
+    variants = variants_for('--target', '640x480', '--target', '1920x1080')
+    assert [variant.out_dir for variant in variants] == ['out/640x480', 'out/1920x1080']
+    assert [variant.settings[1] for variant in variants] == [(640, 480), (1920, 1080)]
+
+
+def test_image_resolution_option_applies_to_every_target():
+    variants = variants_for('--target', '640x480', '--target', '1920x1080', '--image-resolution', '1280x720')
+    assert [variant.settings[1] for variant in variants] == [(1280, 720), (1280, 720)]
@@ -0,0 +1,89 @@
+from qml import PlatformOutput, QmlStream, cluster_platform_views, dedup_platform_views, shared_view_path
+from qml_render import QmlItem, render_view, render_view_text
+
+
+def make_view(color: str, width: str = '0.5 * root.width', extra_lines=()) -> QmlItem:
+    qroot = QmlItem('FocusScope', {'id': 'root'})
+    qitem = QmlItem('Text', {'color': color, 'width': width, 'text': 'currentGame.title'})
+    qitem.extra_lines.extend(extra_lines)
+    qroot.childs.append(qitem)
+    return qroot
+
+
+def make_output(name: str, qroot: QmlItem) -> PlatformOutput:
+    return PlatformOutput(name, {'detailed': render_view_text(qroot)}, [], None, None, [])
+
+
+def merge(outputs):
+    out_files = {}
+    view_files, view_texts = dedup_platform_views(outputs, out_files)
+    cluster_platform_views(view_files, view_texts, out_files)
+    return view_files, out_files
+
+
+def test_view_text_renders_like_the_view():
+    view = render_view_text(make_view("'#ff0000'", extra_lines=['Behavior on opacity { NumberAnimation {} }']))
+    assert view.text() == render_view(make_view("'#ff0000'", extra_lines=['Behavior on opacity { NumberAnimation {} }']))
+    assert view.parts()[1::2] == ["'#ff0000'", '0.5']
+
+
+def test_identical_views_are_written_once():
+    view_files, out_files = merge([make_output('nes', make_view("'#ff0000'")),
+                                   make_output('snes', make_view("'#ff0000'"))])
+    assert view_files['nes'] == view_files['snes']
+    assert list(out_files) == [view_files['nes']['detailed']]
+    assert out_files[view_files['nes']['detailed']] == render_view(make_view("'#ff0000'"))
+
+
+def test_shared_view_path_depends_on_contents():
+    contents = render_view(make_view("'#ff0000'"))
+    assert shared_view_path(contents) == shared_view_path(render_view(make_view("'#ff0000'")))
+    assert shared_view_path(contents) != shared_view_path(render_view(make_view("'#00ff00'")))
+    # Same depth as the platform dirs
+    assert shared_view_path(contents).count('/') == 1
+
+
+def test_streamed_identical_views_are_written_once():
+    written = []
+    stream = QmlStream('theme', {}, lambda path, contents: written.append(path))
+    for name in ('nes', 'snes'):
+        stream.add_platform(make_output(name, make_view("'#ff0000'")))
+    stream.add_platform(make_output('gba', make_view("'#00ff00'")))
+
+    view_files = stream.template_data.view_files
+    assert view_files['nes'] == view_files['snes'] != view_files['gba']
+    assert written == [view_files['nes']['detailed'], view_files['gba']['detailed']]
+
+
+def test_views_differing_in_literals_are_merged():
+    view_files, out_files = merge([make_output('nes', make_view("'#ff0000'")),
+                                   make_output('snes', make_view("'#00ff00'")),
+                                   make_output('gba', make_view("'#0000ff'", width='root.width'))])
+    path = view_files['nes']['detailed']
+    assert view_files['snes']['detailed'] == path
+    assert view_files['gba']['detailed'] != path
+
+    contents = out_files[path]
+    table_name = path.replace('__views/', '').replace('.qml', '.js')
+    assert f"\nimport '{table_name}' as ViewParams\nFocusScope {{" \
+           "\n  readonly property var viewParams: ViewParams.get(modelData.shortName)\n  id: root" in contents
+    assert "color: root.viewParams[0]" in contents
+    # The literals that are the same everywhere stay in the view
+    assert "width: 0.5 * root.width" in contents
+
+    lines = out_files[path.replace('.qml', '.js')].split('\n')
+    rows = lines[lines.index("var values = [") + 1:lines.index("];")]
+    platforms = lines[lines.index("var platforms = {") + 1:lines.index("};")]
+    platform_rows = dict(line.strip().rstrip(',').split(': ') for line in platforms)
+    assert sorted(platform_rows) == ["'nes'", "'snes'"]
+    assert rows[int(platform_rows["'nes'"])] == "    ['#ff0000'],"
+    assert rows[int(platform_rows["'snes'"])] == "    ['#00ff00'],"
+
+
+def test_literals_outside_of_property_values_are_structure():
+    view_files, out_files = merge([
+        make_output('nes', make_view("'#ff0000'", extra_lines=['Behavior on x { NumberAnimation { duration: 100 } }'])),
+        make_output('snes', make_view("'#ff0000'", extra_lines=['Behavior on x { NumberAnimation { duration: 200 } }'])),
+    ])
+    assert view_files['nes']['detailed'] != view_files['snes']['detailed']
+    assert not any(path.endswith('.js') for path in out_files)
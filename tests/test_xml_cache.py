@@ -0,0 +1,54 @@
+import os
+
+from es_reader import XmlCache, read_platform
+
+
+def write_platforms(tmp_path, names, common="<theme><formatVersion>4</formatVersion></theme>"):
+    for name in names:
+        (tmp_path / name).mkdir(exist_ok=True)
+        (tmp_path / name / 'theme.xml').write_text(
+            "<theme><formatVersion>4</formatVersion><include>../common.xml</include></theme>")
+    (tmp_path / 'common.xml').write_text(common)
+
+
+def read_platforms(tmp_path, names, cache):
+    return [read_platform(str(tmp_path), name, str(tmp_path / name / 'theme.xml'), cache) for name in names]
+
+
+def test_shared_include_parsed_once(tmp_path):
+    write_platforms(tmp_path, ['gba', 'nes', 'snes'])
+    cache = XmlCache()
+    read_platforms(tmp_path, ['gba', 'nes', 'snes'], cache)
+
+    assert (cache.hits, cache.misses) == (2, 4)
+    # The platforms' own files are never shared
+    assert list(cache.entries) == [os.path.normpath(str(tmp_path / 'common.xml'))]
+
+
+def test_changed_include_parsed_again(tmp_path):
+    write_platforms(tmp_path, ['nes'])
+    cache = XmlCache()
+    read_platforms(tmp_path, ['nes'], cache)
+
+    write_platforms(tmp_path, ['nes'], common="<theme><formatVersion>4</formatVersion><view name='basic'/></theme>")
+    read_platforms(tmp_path, ['nes'], cache)
+    assert (cache.hits, cache.misses) == (0, 4)
+
+
+def test_least_recently_used_dropped(tmp_path):
+    for name in ['a', 'b', 'c']:
+        (tmp_path / f'{name}.xml').write_text("<theme><formatVersion>4</formatVersion></theme>")
+    cache = XmlCache(max_entries=2)
+    for name in ['a', 'b', 'a', 'c']:
+        cache.load(str(tmp_path / f'{name}.xml'))
+
+    assert [os.path.basename(path) for path in cache.entries] == ['a.xml', 'c.xml']
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_failures_not_cached(tmp_path, capsys):
+    write_platforms(tmp_path, ['gba', 'nes'], common="<theme>")
+    cache = XmlCache()
+    assert read_platforms(tmp_path, ['gba', 'nes'], cache) == [None, None]
+    assert cache.misses == 4
+    assert capsys.readouterr().err.count("common.xml: The file does not follow the rules") == 2
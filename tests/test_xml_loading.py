@@ -0,0 +1,50 @@
+import hashlib
+import io
+
+import pytest
+
+import es_reader
+from es_reader import iter_es_xml_chunks, load_es_xml, parse_es_xml
+
+
+THEME_XML = "<theme><formatVersion>4</formatVersion><!--- a comment ---><view name='basic'/></theme>"
+
+
+@pytest.mark.parametrize('chunk_size', range(1, len(THEME_XML) + 1))
+def test_comment_markers_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(es_reader, 'XML_CHUNK_SIZE', chunk_size)
+    text = ''.join(iter_es_xml_chunks(io.StringIO(THEME_XML)))
+    assert text == "<theme><formatVersion>4</formatVersion><!--  a comment  --><view name='basic'/></theme>"
+
+    root = parse_es_xml(io.StringIO(THEME_XML))
+    assert [node.tag for node in root] == ['formatVersion', 'view']
+
+
+def test_streamed_and_prefetched_files_are_the_same(tmp_path):
+    data = ("<theme><formatVersion>4</formatVersion><unused><a/></unused>"
+            "<view name='basic'><text name='x'><unused/></text></view></theme>").encode()
+    (tmp_path / 'theme.xml').write_bytes(data)
+
+    root, digest = load_es_xml(str(tmp_path / 'theme.xml'))
+    prefetched_root, prefetched_digest = load_es_xml(str(tmp_path / 'theme.xml'), data)
+    assert digest == prefetched_digest == hashlib.sha1(data).hexdigest()
+    # Only the unused top level nodes are dropped
+    assert [node.tag for node in root] == [node.tag for node in prefetched_root] == ['formatVersion', 'view']
+    assert root.find('view/text/unused') is not None
+
+
+@pytest.mark.parametrize('data, message', [
+    (b"<theme><view></theme>", "does not follow the rules of the XML format"),
+    (b"<view name='basic'/>", "must start with a `<theme>` element"),
+])
+def test_invalid_files(tmp_path, data, message):
+    (tmp_path / 'theme.xml').write_bytes(data)
+    with pytest.raises(RuntimeError, match=message):
+        load_es_xml(str(tmp_path / 'theme.xml'))
+    with pytest.raises(RuntimeError, match=message):
+        load_es_xml(str(tmp_path / 'theme.xml'), data)
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(RuntimeError, match="File not found"):
+        load_es_xml(str(tmp_path / 'theme.xml'))
@@ -0,0 +1,66 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+
+# Events in the Chrome trace-event format
+TRACE_EVENTS: List[dict] = []
+TRACING_ENABLED = False
+
+
+def enable_tracing(enabled: bool = True):
+    global TRACING_ENABLED
+    TRACING_ENABLED = enabled
+
+
+@contextmanager
+def span(name: str, category: str = 'converter', **args):
+    if not TRACING_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        TRACE_EVENTS.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start / 1000,
+            'dur': (end - start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+
+def traced(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not TRACING_ENABLED:
+            return func(*args, **kwargs)
+        with span(func.__name__, func.__module__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def take_events() -> List[dict]:
+    # Used by worker processes to send their events back
+    events = TRACE_EVENTS[:]
+    TRACE_EVENTS.clear()
+    return events
+
+
+def add_events(events: List[dict]):
+    TRACE_EVENTS.extend(events)
+
+
+def write_trace(path: str):
+    with open(path, 'w') as file:
+        json.dump({'traceEvents': TRACE_EVENTS, 'displayTimeUnit': 'ms'}, file)